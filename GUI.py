@@ -167,4 +167,10 @@ def main(hex_board, player):
             pass
 
     window.after(1000, game_loop)
-    window.mainloop()
+    try:
+        window.mainloop()
+    finally:
+        # stop the players' worker processes, and give back any shared memory they made
+        for i in (1, -1):
+            if hasattr(player[i], 'close'):
+                player[i].close()
@@ -0,0 +1,264 @@
+"""
+Benchmarks of the board, the heuristics and the searches, run on a fixed corpus of positions for every board size
+The micro benchmarks time single calls, and the macro benchmarks count the nodes of fixed-depth alpha-beta searches
+and the simulations per second of Monte Carlo tree searches
+The results are written as json, and can be compared against a stored baseline, which exits with an error when any
+benchmark got slower by more than the threshold
+
+Save a baseline, then compare a change against it with:
+    python benchmark.py --output baseline.json
+    python benchmark.py --baseline baseline.json
+"""
+import argparse
+import cProfile
+import hashlib
+import json
+import platform
+import random
+import sys
+import time
+from array import array
+from timeit import default_timer
+
+from board import HexBoard
+from heuristic import ShortestPathHeuristic, TwoDistanceHeuristic, ResistanceHeuristic, ChargeHeuristic
+from player import AlphaBetaPlayer, MonteCarloPlayer
+
+# constants:
+FORMAT = 1
+SIZES = (7, 9, 11, 13, 19)
+# the corpus is made by a seeded generator, so every run and every machine benchmarks the same positions
+CORPUS_POSITIONS = 6
+CORPUS_SEED = 1
+# the depth of the alpha-beta searches, so that each size takes a second or two
+SEARCH_DEPTHS = {7: 3, 9: 3, 11: 3, 13: 2, 19: 2}
+
+
+# the positions of a board size: random games a tenth to a half of the way to a full board, with no winner yet
+def corpus(size, count=CORPUS_POSITIONS, seed=CORPUS_SEED):
+    rng = random.Random('%d-%d' % (seed, size))
+    cells = [(row, col) for row in range(size) for col in range(size)]
+    positions = []
+    while len(positions) < count:
+        board = HexBoard(size)
+        for move in rng.sample(cells, rng.randint(size * size // 10, size * size // 2)):
+            board.play(*move)
+        if board.winner == 0:
+            positions.append(board)
+    return positions
+
+
+# a short hash of the corpus's moves, so results from different corpora aren't compared by mistake
+def corpus_digest(positions):
+    moves = repr([board.move_list for board in positions]).encode()
+    return hashlib.sha1(moves).hexdigest()[:12]
+
+
+# the best time per call of calling function on every item, in microseconds. the items are looped over until the
+# loops take at least min_time, and the best of repeat runs is kept. calls is the number of calls the function
+# makes over all the items, when one item stands for more than one call
+def time_per_call(function, items, calls=None, min_time=0.2, repeat=3):
+    def run(loops):
+        start = default_timer()
+        for _ in range(loops):
+            for item in items:
+                function(item)
+        return default_timer() - start
+
+    loops = 1
+    elapsed = run(loops)
+    while elapsed < min_time:
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.2))
+        elapsed = run(loops)
+    # slow benchmarks already took long enough to be steady
+    if elapsed < 5 * min_time:
+        elapsed = min([elapsed] + [run(loops) for _ in range(repeat - 1)])
+    return elapsed / (loops * (calls or len(items))) * 10**6
+
+
+def _play_undo(item):
+    board, row, col = item
+    board.play(row, col)
+    board.undo()
+
+
+def _play_winner_undo(item):
+    board, row, col = item
+    board.play(row, col)
+    board.winner
+    board.undo()
+
+
+def _is_connected(board):
+    board.is_connected(1)
+    board.is_connected(-1)
+
+
+# returns {name: result} for the micro benchmarks of one size, where a result is a time per call in microseconds
+def micro_benchmarks(size, positions, min_time=0.2):
+    moves = [(board, row, col) for board in positions
+             for row in range(size) for col in range(size) if board[row][col] == 0]
+    stones = [[(board[row][col], col, row) for row, col in board.move_list] for board in positions]
+    base_charge = ChargeHeuristic.base_charge(size)
+
+    # the field of every position is built from the empty board, one stone at a time
+    def add_charges(position_stones):
+        charge = array('d', base_charge)
+        for sign, x, y in position_stones:
+            ChargeHeuristic.add_charge(sign, charge, x, y)
+
+    benchmarks = [
+        ('board.play_undo', _play_undo, moves, None),
+        ('board.play_winner_undo', _play_winner_undo, moves, None),
+        ('board.hashable', HexBoard.hashable, positions, None),
+        ('board.is_connected', _is_connected, positions, 2 * len(positions)),
+        ('ChargeHeuristic.add_charge', add_charges, stones, sum(len(s) for s in stones)),
+        # a new charge heuristic every time, or it would reuse the field of the last position
+        ('ChargeHeuristic.get_child_values', lambda board: ChargeHeuristic(size).get_child_values(board),
+         positions, None),
+    ]
+    for heuristic in (ShortestPathHeuristic(incremental=True), TwoDistanceHeuristic(incremental=True),
+                      ResistanceHeuristic(incremental=True)):
+        name = type(heuristic).__name__
+        benchmarks.append((name + '.get_value', heuristic.get_value, positions, None))
+        benchmarks.append((name + '.get_child_values', heuristic.get_child_values, positions, None))
+
+    results = dict()
+    for name, function, items, calls in benchmarks:
+        results[name] = time_per_call(function, items, calls, min_time)
+    return results
+
+
+# returns {name: result} for the macro benchmarks of one size: the nodes of a fixed-depth alpha-beta search of every
+# position, which only changes when the search does, and the simulations per second of Monte Carlo tree search
+def macro_benchmarks(size, positions, mcts_time=1.0, repeat=3):
+    depth = SEARCH_DEPTHS.get(size, 1)
+    nodes = 0
+    start = default_timer()
+    for board in positions:
+        player = AlphaBetaPlayer(board.turn, ShortestPathHeuristic(incremental=True), depth,
+                                 sorter=ChargeHeuristic(size))
+        player.search_root(board, depth)
+        nodes += player.nodes
+    elapsed = default_timer() - start
+
+    # the simulations depend on the random rollouts, so the searches are seeded. every position is searched from
+    # scratch a few times, and the best rate is kept, the same as the micro benchmarks
+    searches = positions[:2]
+    search_time = mcts_time / (len(searches) * repeat)
+    rate = 0
+    for board in searches:
+        best = 0
+        for i in range(repeat):
+            random.seed(CORPUS_SEED + i)
+            player = MonteCarloPlayer(board.turn, size, search_time)
+            count, _ = player.search(board)
+            best = max(best, count / search_time)
+        rate += best / len(searches)
+    return {
+        'alpha_beta.depth_%d.nodes' % depth: nodes,
+        'alpha_beta.depth_%d.nodes_per_second' % depth: nodes / elapsed,
+        'mcts.simulations_per_second': rate,
+    }
+
+
+# whether a bigger result is better, the unit of the result, and whether the result should be exactly the same
+# on every run, from the benchmark's name
+def describe(name):
+    if name.endswith('.nodes'):
+        return False, 'nodes', True
+    if name.endswith('_per_second'):
+        return True, name.rsplit('.', 1)[1].replace('_', ' '), False
+    return False, 'us', False
+
+
+# runs the benchmarks and returns them as a dictionary that can be written as json
+def run(sizes=SIZES, micro=True, macro=True, min_time=0.2, mcts_time=1.0, verbose=True):
+    report = {
+        'format': FORMAT,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus': dict(),
+        'results': dict(),
+    }
+    for size in sizes:
+        positions = corpus(size)
+        report['corpus'][str(size)] = corpus_digest(positions)
+        results = dict()
+        if micro:
+            results.update(micro_benchmarks(size, positions, min_time))
+        if macro:
+            results.update(macro_benchmarks(size, positions, mcts_time))
+        for name, value in results.items():
+            higher_is_better, unit, exact = describe(name)
+            report['results']['%d/%s' % (size, name)] = {'value': value, 'unit': unit,
+                                                         'higher_is_better': higher_is_better, 'exact': exact}
+            if verbose:
+                print('%-50s %14.2f %s' % ('%d/%s' % (size, name), value, unit))
+    return report
+
+
+# prints every benchmark of the report next to the baseline's, and returns the names of the ones that got worse
+# by more than threshold. results that should be exact are only marked as changed
+def compare(report, baseline, threshold=0.1):
+    for size, digest in report['corpus'].items():
+        if baseline['corpus'].get(size, digest) != digest:
+            print('warning: the corpus of size', size, 'is not the one the baseline was run on')
+    regressions = []
+    for name, result in report['results'].items():
+        if name not in baseline['results']:
+            continue
+        old = baseline['results'][name]['value']
+        new = result['value']
+        change = (new - old) / old if old else 0.0
+        worse = -change if result['higher_is_better'] else change
+        if result['exact']:
+            status = 'changed' if new != old else ''
+        elif worse > threshold:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif worse < -threshold:
+            status = 'improved'
+        else:
+            status = ''
+        print('%-50s %14.2f %14.2f %+7.1f%% %s' % (name, old, new, 100 * change, status))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the board, heuristics and searches')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='the board sizes to benchmark')
+    parser.add_argument('--only', choices=('micro', 'macro'), help='only run one kind of benchmark')
+    parser.add_argument('--min-time', type=float, default=0.2, help='the least time to time each micro benchmark')
+    parser.add_argument('--mcts-time', type=float, default=1.0, help='the total Monte Carlo search time of each size')
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--baseline', help='compare the results against this json file')
+    parser.add_argument('--threshold', type=float, default=0.1, help='the slowdown that counts as a regression')
+    parser.add_argument('--profile', action='store_true', help='profile the benchmarks and print the slowest calls')
+    args = parser.parse_args()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    report = run(args.sizes, args.only != 'macro', args.only != 'micro', args.min_time, args.mcts_time)
+    if profiler:
+        profiler.disable()
+        profiler.print_stats(sort='time')
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get('format') != FORMAT:
+            sys.exit('%s is not a benchmark file of this version' % args.baseline)
+        print()
+        print('%-50s %14s %14s %8s' % ('benchmark', 'baseline', 'current', 'change'))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            sys.exit('%d benchmarks got slower by more than %d%%' % (len(regressions), 100 * args.threshold))
+
+
+if __name__ == '__main__':
+    main()
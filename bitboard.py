@@ -0,0 +1,220 @@
+"""
+A HexBoard backend that stores the stones of each player as integer bitmasks,
+so that copying, hashing and connection checks are done with a handful of mask operations
+"""
+from board import HexBoard, ADJACENT, SWAP_MOVE
+
+
+# the bit layout of a board size, and the masks that are shared by every board of that size
+class BitLayout:
+    def __init__(self, size):
+        self.size = size
+        # every row gets one spare guard bit, so a stone shifted sideways off the board never wraps onto another row
+        self.width = size + 1
+        row_mask = (1 << size) - 1
+        # every cell that is on the board
+        self.full = 0
+        for row in range(size):
+            self.full |= row_mask << (row * self.width)
+        # the cells along each wall. player 1 connects left to right, player 2 connects top to bottom
+        self.left = sum(1 << (row * self.width) for row in range(size))
+        self.right = self.left << (size - 1)
+        self.top = row_mask
+        self.bottom = row_mask << ((size - 1) * self.width)
+        # the wall each player's connections are grown from, indexed by player number
+        self.start = [0, self.left, self.top]
+        # the bit offset of a step in each of the ADJACENT directions
+        self.shifts = [dy * self.width + dx for dy, dx in ADJACENT]
+        # the neighbours of every cell, indexed by the cell's bit index
+        self.adjacent = [self.neighbors(1 << index) for index in range(size * self.width)]
+
+    # a layout never changes, so board copies can share it
+    def __deepcopy__(self, memo):
+        return self
+
+    def index(self, row, col):
+        return row * self.width + col
+
+    def bit(self, row, col):
+        return 1 << (row * self.width + col)
+
+    def cell(self, index):
+        return divmod(index, self.width)
+
+    # every cell adjacent to a cell in the mask
+    def neighbors(self, mask):
+        spread = 0
+        for shift in self.shifts:
+            if shift > 0:
+                spread |= mask << shift
+            else:
+                spread |= mask >> -shift
+        return spread & self.full
+
+    # grows the seed cells through the allowed cells until the group stops changing
+    def flood(self, seed, allowed):
+        group = seed & allowed
+        while True:
+            grown = (group | self.neighbors(group)) & allowed
+            if grown == group:
+                return group
+            group = grown
+
+    # converts a mask into a list of (row, col) positions
+    def cells(self, mask):
+        positions = []
+        while mask:
+            low = mask & -mask
+            positions.append(self.cell(low.bit_length() - 1))
+            mask ^= low
+        return positions
+
+
+_layouts = dict()
+
+
+# layouts are built once per board size
+def get_layout(size):
+    if size not in _layouts:
+        _layouts[size] = BitLayout(size)
+    return _layouts[size]
+
+
+# a read-only view of a row of a BitHexBoard that behaves like a row of HexBoard.board
+class BitRow:
+    __slots__ = ('_board', '_offset')
+
+    def __init__(self, board, row):
+        self._board = board
+        self._offset = row * board.layout.width
+
+    def __getitem__(self, col):
+        size = self._board.size
+        if col < 0:
+            col += size
+        if not 0 <= col < size:
+            raise IndexError('board column out of range')
+        bit = 1 << (self._offset + col)
+        if self._board.masks[1] & bit:
+            return 1
+        if self._board.masks[-1] & bit:
+            return -1
+        return 0
+
+    def __len__(self):
+        return self._board.size
+
+    def __iter__(self):
+        return (self[col] for col in range(self._board.size))
+
+
+# a drop-in replacement for HexBoard, including the swap rule and the move list
+class BitHexBoard(HexBoard):
+    def __init__(self, size=11, swap_rule=False):
+        super(BitHexBoard, self).__init__(size, swap_rule)
+        self.layout = get_layout(size)
+        # the stones of each player. indexed by player number, so masks[1] is player 1 and masks[-1] is player 2
+        self.masks = [0, 0, 0]
+        # the rows are views onto the masks, so board[row][col] indexing keeps working
+        self.board = [BitRow(self, row) for row in range(size)]
+        # the stones of each player that are connected to their starting wall, which take the place of the
+        # connection tracker. a player has won once these reach the opposite wall. the value before every stone
+        # was placed is kept, so that removing the stone can put it back
+        self._connections = None
+        self.reached = [0, 0, 0]
+        self._reached_history = []
+
+    # the board state is just the two masks
+    def hashable(self):
+        return self.masks[1], self.masks[-1]
+
+    # every empty cell on the board
+    @property
+    def empty(self):
+        return self.layout.full & ~(self.masks[1] | self.masks[-1])
+
+    @property
+    def winner(self):
+        if self._winner is None:
+            if self.reached[1] & self.layout.right:
+                self._winner = 1
+            elif self.reached[-1] & self.layout.bottom:
+                self._winner = -1
+            else:
+                self._winner = 0
+        return self._winner
+
+    # the same rules as HexBoard.play, with the cell checked on the masks
+    def play(self, row, col):
+        if self.winner != 0:
+            return False
+
+        size = self.size
+        if 0 <= row < size and 0 <= col < size and not (self.masks[1] | self.masks[-1]) & self.layout.bit(row, col):
+            self._place(row, col, self.turn)
+            self.move_list.append((row, col))
+            self.turn = -self.turn
+            self._winner = None
+            return True
+
+        # the swap mirrors player 1's first stone across the board and gives it to player 2
+        if self.swap_rule and len(self.move_list) == 1 and (
+                (row, col) == SWAP_MOVE or (row, col) == self.move_list[0]):
+            row, col = self.move_list[0]
+            self._remove(row, col)
+            self._place(col, row, -1)
+            self.move_list.append(SWAP_MOVE)
+            self.turn = -self.turn
+            return True
+        return False
+
+    # puts a stone on the masks. if it touches the player's starting wall or the stones connected to it, its group
+    # joins them. stones that were already connected are left out of the flood fill, since their groups are too
+    def _place(self, row, col, player):
+        layout = self.layout
+        index = layout.index(row, col)
+        bit = 1 << index
+        self.masks[player] |= bit
+        reached = self.reached[player]
+        self._reached_history.append(reached)
+        if bit & layout.start[player] or layout.adjacent[index] & reached:
+            self.reached[player] = reached | layout.flood(bit, self.masks[player] & ~reached)
+        self._toggle_keys(row, col, player)
+
+    # takes a stone off the masks. this must always be the most recently placed stone
+    def _remove(self, row, col):
+        bit = self.layout.bit(row, col)
+        player = 1 if self.masks[1] & bit else -1
+        self._toggle_keys(row, col, player)
+        self.reached[player] = self._reached_history.pop()
+        self.masks[player] &= ~bit
+
+    # checks if a player has made a connection between their walls, using a layered flood fill
+    def is_connected(self, player, debug=False):
+        layout = self.layout
+        stones = self.masks[player]
+        if player == 1:
+            start, goal = layout.right, layout.left
+        else:
+            start, goal = layout.bottom, layout.top
+
+        # each layer holds the stones that are one step further from the starting wall
+        layers = [stones & start]
+        reached = layers[0]
+        while layers[-1] and not layers[-1] & goal:
+            layer = layout.neighbors(layers[-1]) & stones & ~reached
+            reached |= layer
+            layers.append(layer)
+        if not layers[-1]:
+            return None
+
+        # walk back through the layers to build the shortest path
+        current = layers[-1] & goal
+        current &= -current
+        winning_group = []
+        for layer in reversed(layers[:-1]):
+            winning_group.append(layout.cell(current.bit_length() - 1))
+            current = layout.neighbors(current) & layer
+            current &= -current
+        winning_group.append(layout.cell(current.bit_length() - 1))
+        return winning_group
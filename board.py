@@ -1,6 +1,7 @@
 """
 A data structure used to represent an arbitrary hex game state
 """
+import random
 from math import inf
 from heapq import heappop, heappush
 
@@ -11,6 +12,103 @@ SWAP_MOVE = (-1, -1)
 ADJACENT = [(-1, 0), (0, -1), (1, -1), (1, 0), (0, 1), (-1, 1)]
 
 
+# random 64 bit numbers for every (player, cell) pair, used to build zobrist keys, and one for player 2 to move
+# the generator is seeded so that every process agrees on the keys for a board size
+_zobrist_tables = dict()
+
+
+def zobrist_table(size):
+    if size not in _zobrist_tables:
+        generator = random.Random(size)
+        # indexed by player number, so table[1] is player 1 and table[-1] is player 2. table[0] is the turn key
+        side = generator.getrandbits(64)
+        _zobrist_tables[size] = [side] + [[generator.getrandbits(64) for _ in range(size * size)] for _ in (1, -1)]
+    return _zobrist_tables[size]
+
+
+# a disjoint set over the cells of the board, plus one virtual node for each wall
+# stones are unioned with their neighbours as they are placed, so a connection between two walls is found in O(α(n))
+# there is no path compression, so every union can be rolled back when the stone is removed
+class ConnectionTracker:
+    def __init__(self, size):
+        self.size = size
+        cells = size * size
+        # the virtual wall nodes. player 1 connects left to right, player 2 connects top to bottom
+        self.left, self.right, self.top, self.bottom = range(cells, cells + 4)
+        self.parent = list(range(cells + 4))
+        self.group_size = [1] * (cells + 4)
+        # for every stone that is still on the board, the list of unions it made
+        self.history = []
+        self.neighbors = ConnectionTracker._neighbor_table(size)
+
+    # the list of on-board neighbours of every cell, built once per board size
+    _neighbor_tables = dict()
+
+    @staticmethod
+    def _neighbor_table(size):
+        if size not in ConnectionTracker._neighbor_tables:
+            table = []
+            for row in range(size):
+                for col in range(size):
+                    table.append([(row + dy, col + dx) for dy, dx in ADJACENT
+                                  if 0 <= row + dy < size and 0 <= col + dx < size])
+            ConnectionTracker._neighbor_tables[size] = table
+        return ConnectionTracker._neighbor_tables[size]
+
+    def find(self, node):
+        parent = self.parent
+        while parent[node] != node:
+            node = parent[node]
+        return node
+
+    # joins two groups, returning the change that was made so it can be undone
+    def _union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return None
+        if self.group_size[a] > self.group_size[b]:
+            a, b = b, a
+        self.parent[a] = b
+        self.group_size[b] += self.group_size[a]
+        return a, b
+
+    # connects a newly placed stone to its walls and to the neighbouring stones of the same player
+    def add(self, board, row, col, player):
+        cell = row * self.size + col
+        nodes = [r * self.size + c for r, c in self.neighbors[cell] if board[r][c] == player]
+        if player == 1:
+            if col == 0:
+                nodes.append(self.left)
+            if col == self.size - 1:
+                nodes.append(self.right)
+        else:
+            if row == 0:
+                nodes.append(self.top)
+            if row == self.size - 1:
+                nodes.append(self.bottom)
+        changes = []
+        for node in nodes:
+            change = self._union(cell, node)
+            if change is not None:
+                changes.append(change)
+        self.history.append(changes)
+
+    # rolls back the unions made by the most recently added stone
+    def remove(self):
+        for child, root in reversed(self.history.pop()):
+            self.parent[child] = child
+            self.group_size[root] -= self.group_size[child]
+
+    # returns the player whose walls are connected, or 0
+    def winner(self):
+        if self.find(self.left) == self.find(self.right):
+            return 1
+        if self.find(self.top) == self.find(self.bottom):
+            return -1
+        return 0
+
+
 # This class is an abstract model for the hex board that can store information
 class HexBoard:
     def __init__(self, size=11, swap_rule=False):
@@ -28,6 +126,14 @@ class HexBoard:
         self._winner = 0
         # the group of stones that connect the sides
         self._winning_group = None
+        # tracks which stones are connected, so the winner can be found without searching
+        self._connections = ConnectionTracker(size)
+        # the zobrist key of the stones on the board, updated with every stone placed or removed
+        self._key = 0
+        self._zobrist = zobrist_table(size)
+        # the keys of the board under its symmetries: turned half a turn, transposed with the colours swapped,
+        # and both. transposing turns one player's walls into the other's, so the colours have to swap with it
+        self._symmetric_keys = [0, 0, 0]
 
     # for convenience, treat indexing on the hex board as indexing on the board itself
     def __getitem__(self, item):
@@ -37,17 +143,58 @@ class HexBoard:
     def hashable(self):
         return tuple((tuple(row) for row in self.board))
 
+    # a 64 bit hash of the board state. much cheaper than hashable() for table lookups
+    # the turn is part of the key, because after a swap the same stones can come up with either player to move
+    @property
+    def key(self):
+        if self.turn == 1:
+            return self._key
+        return self._key ^ self._zobrist[0]
+
+    # the smallest key of the board under its symmetries, so that equivalent positions share a key
+    # returns (key, symmetry), where the symmetry maps moves on this board to moves on the board the key came from:
+    # 0 is the board itself, 1 is turned half a turn, 2 is transposed with the colours swapped and 3 is both
+    # with the colours swapped, the player to move swaps too, and values from player 1's point of view are negated
+    @property
+    def canonical_key(self):
+        side = self._zobrist[0]
+        keys = [self.key, self._symmetric_keys[0] ^ (side if self.turn == -1 else 0)]
+        # while the swap rule can still be used, the colours aren't interchangeable
+        if not (self.swap_rule and len(self.move_list) <= 2):
+            keys.append(self._symmetric_keys[1] ^ (side if self.turn == 1 else 0))
+            keys.append(self._symmetric_keys[2] ^ (side if self.turn == 1 else 0))
+        key = min(keys)
+        return key, keys.index(key)
+
+    # maps a move through one of the symmetries of canonical_key. every symmetry is its own inverse,
+    # so this also maps moves back
+    def map_move(self, move, symmetry):
+        if symmetry == 0 or move == SWAP_MOVE:
+            return move
+        row, col = move
+        last = self.size - 1
+        if symmetry == 1:
+            return last - row, last - col
+        elif symmetry == 2:
+            return col, row
+        return last - col, last - row
+
+    # the key the board would have after the player to move takes a cell, without playing the move
+    def child_key(self, row, col):
+        return self.key ^ self._zobrist[self.turn][row * self.size + col] ^ self._zobrist[0]
+
     # treat the winner as a property so that it is only checked when we need to
     @property
     def winner(self):
         if self._winner is None:
-            self._update_winner()
+            self._winner = self._connections.winner()
         return self._winner
 
+    # the path itself is only searched for when somebody asks to see it
     @property
     def winning_group(self):
-        if self._winner is None:
-            self._update_winner()
+        if self._winning_group is None and self.winner != 0:
+            self._winning_group = self.is_connected(self.winner)
         return self._winning_group
 
     # checks if a given position is on the board
@@ -63,8 +210,8 @@ class HexBoard:
             return moved
 
         # if there's no move there already, its valid
-        if self.in_bounds(row, col) and self.board[row][col] is 0:
-            self.board[row][col] = self.turn
+        if self.in_bounds(row, col) and self.board[row][col] == 0:
+            self._place(row, col, self.turn)
             self.move_list.append((row, col))
             self.turn *= -1
             moved = True
@@ -76,8 +223,8 @@ class HexBoard:
                         (row, col) == SWAP_MOVE or (row, col) == self.move_list[0]):
             # we mirror it across the board to make it seem like the players switched
             row, col = self.move_list[0]
-            self.board[row][col] = 0
-            self.board[col][row] = -1
+            self._remove(row, col)
+            self._place(col, row, -1)
             self.move_list.append(SWAP_MOVE)
             self.turn *= -1
             moved = True
@@ -93,10 +240,43 @@ class HexBoard:
         row, col = self.move_list.pop()
         if (row, col) == SWAP_MOVE:
             row, col = self.move_list[0]
-            self.board[col][row] = 0
-            self.board[row][col] = 1
+            self._remove(col, row)
+            self._place(row, col, 1)
         else:
-            self.board[row][col] = 0
+            self._remove(row, col)
+
+    # puts a stone on the board without using a turn, for a cell whose colour is already decided
+    # the stone isn't added to the move list, so it can't be undone
+    def fill(self, row, col, player):
+        self._place(row, col, player)
+        self._winner = None
+
+    # puts a stone on the board and connects it to its group
+    def _place(self, row, col, player):
+        self._set(row, col, player)
+        self._connections.add(self, row, col, player)
+        self._toggle_keys(row, col, player)
+
+    # takes a stone off the board. this must always be the most recently placed stone
+    def _remove(self, row, col):
+        self._toggle_keys(row, col, self.board[row][col])
+        self._connections.remove()
+        self._set(row, col, 0)
+
+    # adds or removes a stone from the zobrist key, and from the keys of the symmetric boards
+    def _toggle_keys(self, row, col, player):
+        table = self._zobrist
+        last = self.size * self.size - 1
+        index = row * self.size + col
+        transposed = col * self.size + row
+        self._key ^= table[player][index]
+        self._symmetric_keys[0] ^= table[player][last - index]
+        self._symmetric_keys[1] ^= table[-player][transposed]
+        self._symmetric_keys[2] ^= table[-player][last - transposed]
+
+    # writes a value into a cell without checking any rules. 0 clears the cell
+    def _set(self, row, col, value):
+        self.board[row][col] = value
 
     # sets the winner of the match
     def resign(self):
@@ -156,26 +336,11 @@ class HexBoard:
         else:
             return None
 
-    # checks if either player has won
-    def _update_winner(self):
-        group = self.is_connected(1)
-        if group:
-            self._winner = 1
-            self._winning_group = group
-            return
-        group = self.is_connected(-1)
-        if group:
-            self._winner = -1
-            self._winning_group = group
-            return
-
-        self._winner = 0
-        self._winning_group = None
-
     # draws a nice looking ascii board
     def pretty_print(self, chars=None):
         # spacing should be odd for things to be consistent
         spacing = 3
+        winning_group = self.winning_group
         string = '\n' + ' ' * (2 + (spacing + 1) // 2)
         for i in range(self.size):
             string += ('{:' + str(spacing + 1) + '}').format(str(i + 1) + ':')
@@ -183,11 +348,11 @@ class HexBoard:
         for i, row in enumerate(self.board):
             string += ('\n' + '{:>' + str(2 + i * (spacing + 1) // 2) + '} ■').format(str(i + 1) + ':')
             for j, num in enumerate(row):
-                if self._winning_group and (i,j) in self._winning_group and (i,j-1) in self._winning_group:
+                if winning_group and (i,j) in winning_group and (i,j-1) in winning_group:
                     string += ']' + ' ' * (spacing - 2) + '['
-                elif self._winning_group and (i,j) in self._winning_group:
+                elif winning_group and (i,j) in winning_group:
                     string += ' ' * (spacing - 1) + '['
-                elif self._winning_group and (i,j-1) in self._winning_group:
+                elif winning_group and (i,j-1) in winning_group:
                     string += ']' + ' ' * (spacing - 1)
                 elif self.move_list and (self.move_list[-1] == (i,j) or
                         (self.move_list[-1] == SWAP_MOVE and self.move_list[-2] == (i,j))):
@@ -208,7 +373,7 @@ class HexBoard:
                     string += '○'
                 else:
                     string += '●'
-            if self._winning_group and (i,self.size-1) in self.winning_group:
+            if winning_group and (i,self.size-1) in winning_group:
                 string += ']' + ' ' * (spacing-1)
             elif self.move_list and self.move_list[-1] == (i, self.size-1):
                 string += ')' + ' ' * (spacing-1)
@@ -0,0 +1,149 @@
+"""
+An opening book: the best move of every opening position up to a few moves deep, searched offline
+The book is a sorted file of fixed-size records that is memory mapped and binary searched, so opening it is instant
+Positions are keyed by the board's canonical key, so a position and its mirror images share one record
+
+Generate a book with:
+    python book.py 7 --swap --depth 3 --plies 2
+"""
+import argparse
+import mmap
+import struct
+from copy import deepcopy
+from timeit import default_timer
+
+from board import HexBoard, SWAP_MOVE
+
+# constants:
+# the file starts with a magic number, a format version, the board size, the swap rule, and the number of records
+HEADER = struct.Struct('<4sBBBxI')
+MAGIC = b'HXBK'
+VERSION = 2
+# each record is a position key, the move to play as (row, col), and the depth it was searched to
+# the swap move is stored as (-1, -1), so with the swap rule the book also says whether to swap each first move
+# moves are stored on the mirror image of the position the key came from
+RECORD = struct.Struct('<QbbBx')
+
+
+# a book file, opened read only. the records are read straight out of the memory map when they are looked up
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, swap_rule, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not an opening book' % path)
+        self.swap_rule = bool(swap_rule)
+        # statistics, to see how often the book is used
+        self.probes = 0
+        self.hits = 0
+
+    # a memory map can't be sent to another process, so copies open the file again
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    # returns the book move for the board, or None if the position isn't in the book
+    def lookup(self, board):
+        if board.size != self.size or board.swap_rule != self.swap_rule or board.winner != 0:
+            return None
+        self.probes += 1
+        key, symmetry = board.canonical_key
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            record_key, row, col, _ = RECORD.unpack_from(self._map, HEADER.size + middle * RECORD.size)
+            if record_key < key:
+                low = middle + 1
+            elif record_key > key:
+                high = middle
+            else:
+                move = board.map_move((row, col), symmetry)
+                # a key collision could give a move that isn't legal here
+                if move == SWAP_MOVE:
+                    legal = board.swap_rule and len(board.move_list) == 1
+                else:
+                    legal = board.in_bounds(*move) and board[move[0]][move[1]] == 0
+                if not legal:
+                    return None
+                self.hits += 1
+                return move
+        return None
+
+
+# writes records of (key, move, depth) to a book file, sorted by key
+def write_book(path, size, swap_rule, records):
+    records = sorted(records)
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, size, swap_rule, len(records)))
+        for key, (row, col), depth in records:
+            file.write(RECORD.pack(key, row, col, depth))
+
+
+# searches every opening position up to plies moves into the game with the player's search, and returns the records
+# positions that are mirror images of each other are only searched once
+def generate(size, swap_rule, player, plies=2, verbose=True):
+    records = dict()
+    frontier = [HexBoard(size, swap_rule)]
+    start = default_timer()
+    for ply in range(plies):
+        next_frontier = []
+        for board in frontier:
+            key, symmetry = board.canonical_key
+            if key in records or board.winner != 0:
+                continue
+            player.transposition_table.new_search()
+            val, move_list, _ = player.search_root(board, player.search_depth)
+            if move_list is None:
+                continue
+            move = move_list[0]
+            records[key] = (board.map_move(move, symmetry), player.search_depth)
+            if ply + 1 == plies:
+                continue
+
+            moves = [(y, x) for y in range(size) for x in range(size) if board[y][x] == 0]
+            if swap_rule and len(board.move_list) == 1:
+                moves.append(SWAP_MOVE)
+            for next_move in moves:
+                child = deepcopy(board)
+                child.play(*next_move)
+                next_frontier.append(child)
+        if verbose:
+            print('ply', ply, 'positions', len(records), 'time %.1f' % (default_timer() - start))
+        frontier = next_frontier
+    return [(key, move, depth) for key, (move, depth) in records.items()]
+
+
+def main():
+    from heuristic import ShortestPathHeuristic, TwoDistanceHeuristic, ChargeHeuristic
+    from player import AlphaBetaPlayer
+
+    parser = argparse.ArgumentParser(description='generate an opening book')
+    parser.add_argument('size', type=int, help='the board size')
+    parser.add_argument('--swap', action='store_true', help='use the swap rule')
+    parser.add_argument('--depth', type=int, default=3, help='the alpha-beta search depth of every position')
+    parser.add_argument('--plies', type=int, default=2, help='the number of moves into the game to search')
+    parser.add_argument('--heuristic', choices=('shortest-path', 'two-distance'), default='two-distance')
+    parser.add_argument('--output', help='the book file, by default book_<size>[_swap].bin')
+    args = parser.parse_args()
+
+    if args.heuristic == 'shortest-path':
+        heuristic = ShortestPathHeuristic(incremental=True)
+    else:
+        heuristic = TwoDistanceHeuristic(incremental=True)
+    player = AlphaBetaPlayer(1, heuristic, args.depth, sorter=ChargeHeuristic(args.size))
+    output = args.output or 'book_%d%s.bin' % (args.size, '_swap' if args.swap else '')
+    records = generate(args.size, args.swap, player, args.plies)
+    write_book(output, args.size, args.swap, records)
+    print('wrote', len(records), 'positions to', output)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,15 +5,40 @@ used by players to evaluate board positions
 import itertools
 import math
 from abc import ABC
-from copy import deepcopy
+from array import array
+from collections import deque
 from heapq import heappush, heappop
 from math import inf
 
 from board import SWAP_MOVE, ADJACENT
 
 
+# the flat indices of the on-board neighbours of every cell, built once per board size
+_neighbor_indices = dict()
+
+
+def neighbor_indices(size):
+    if size not in _neighbor_indices:
+        _neighbor_indices[size] = [[(row + dy) * size + col + dx for dy, dx in ADJACENT
+                                    if 0 <= row + dy < size and 0 <= col + dx < size]
+                                   for row in range(size) for col in range(size)]
+    return _neighbor_indices[size]
+
+
+# the flat indices of the cells along each of a player's walls. the search starts from the first one
+def wall_indices(size, player):
+    if player == 1:
+        return [row * size for row in range(size)], [row * size + size - 1 for row in range(size)]
+    else:
+        return list(range(size)), [(size - 1) * size + col for col in range(size)]
+
+
 # a heuristic interface
 class Heuristic(ABC):
+    # heuristics that reuse the work done on a position to value its children set this
+    # the search then values the last ply with child_evaluator, instead of calling get_value on every leaf
+    incremental = False
+
     # gets the value of a given board state
     # if a player has won, the board value is maximally positive or negative
     def get_value(self, board, debug=False):
@@ -23,6 +48,17 @@ class Heuristic(ABC):
         else:
             return 0
 
+    # returns a function that gives the value of the board after a move at (row, col)
+    # incremental heuristics do the work that is shared by every child once, when the function is made,
+    # so the function is only valid until the board changes
+    def child_evaluator(self, board):
+        def evaluate(row, col):
+            board.play(row, col)
+            value = self.get_value(board)
+            board.undo()
+            return value
+        return evaluate
+
     # gets an array of heuristic values for every position on the board
     # intended to be used to sort options
     def get_child_values(self, board, debug=False):
@@ -31,18 +67,121 @@ class Heuristic(ABC):
             value = self.get_value(board)
             return [[value] * board.size for _ in range(board.size)]
         # otherwise, try every legal move
+        evaluate = self.child_evaluator(board)
         heuristic = [[0] * board.size for _ in range(board.size)]
         for i,j in itertools.product(range(board.size), repeat=2):
             if board[i][j] == 0:
-                board.play(i,j)
-                heuristic[i][j] = self.get_value(board)
-                board.undo()
+                heuristic[i][j] = evaluate(i, j)
         return heuristic
 
 
 # finds out which player has fewer moves remaining
 # in the shortest straight-line path across the board
 class ShortestPathHeuristic(Heuristic):
+    def __init__(self, incremental=False):
+        # reuse the distance maps of the parent position to value all of its children in one pass
+        self.incremental = incremental
+
+    # in incremental mode, the shortest path through every empty cell is read from two distance maps per player
+    # a new stone can only shorten its own player's paths through that cell, and it only lengthens the opponent's
+    # distance when it lands on one of their shortest paths. only then is a search needed, and it is guided by the
+    # old distance map, so it only looks at the region around the blocked cell
+    def child_evaluator(self, board):
+        if not self.incremental or board.winner != 0:
+            return super(ShortestPathHeuristic, self).child_evaluator(board)
+
+        size = board.size
+        cells = [value for row in board.board for value in row]
+        maps = {player: self.distance_maps(cells, size, player) for player in (1, -1)}
+        mover = board.turn
+
+        def evaluate(row, col):
+            index = row * size + col
+            dist = dict()
+            for player in (1, -1):
+                start_map, end_map, player_dist = maps[player]
+                through = start_map[index] + end_map[index]
+                if player == mover:
+                    # the empty cell was counted by both maps, and now costs nothing
+                    dist[player] = min(player_dist, through - 2)
+                elif player_dist == inf or through - 1 > player_dist:
+                    dist[player] = player_dist
+                else:
+                    dist[player] = self.blocked_distance(cells, size, player, end_map, index)
+            if dist[mover] == 0:
+                return mover * inf
+            return dist[-1] - dist[1]
+        return evaluate
+
+    # finds the distance from each of a player's walls to every cell, counting every empty cell on the way
+    # including the cell itself. returns both maps, and the player's shortest distance across the board
+    @staticmethod
+    def distance_maps(cells, size, player):
+        neighbors = neighbor_indices(size)
+        maps = []
+        for wall in wall_indices(size, player):
+            dist = [inf] * len(cells)
+            # a 0-1 breadth first search. stones are free, so they go on the front of the queue
+            queue = deque()
+            for index in wall:
+                if cells[index] == player:
+                    dist[index] = 0
+                    queue.appendleft(index)
+                elif cells[index] == 0:
+                    dist[index] = 1
+                    queue.append(index)
+            while queue:
+                index = queue.popleft()
+                current = dist[index]
+                for next_index in neighbors[index]:
+                    cell = cells[next_index]
+                    if cell == player:
+                        if current < dist[next_index]:
+                            dist[next_index] = current
+                            queue.appendleft(next_index)
+                    elif cell == 0:
+                        if current + 1 < dist[next_index]:
+                            dist[next_index] = current + 1
+                            queue.append(next_index)
+            maps.append(dist)
+        start_map, end_map = maps
+        return start_map, end_map, min(start_map[index] for index in wall_indices(size, player)[1])
+
+    # the shortest distance of a player once the opponent takes the blocked cell
+    # an A* search, using the distances to the far wall from before the cell was blocked
+    @staticmethod
+    def blocked_distance(cells, size, player, end_map, blocked):
+        neighbors = neighbor_indices(size)
+        start_wall, end_wall = wall_indices(size, player)
+        end_wall = set(end_wall)
+        best = dict()
+        searchq = []
+        for index in start_wall:
+            cell = cells[index]
+            if index == blocked or (cell != 0 and cell != player):
+                continue
+            cost = 0 if cell == player else 1
+            best[index] = cost
+            # the estimate is the distance so far, plus the rest of the old path after this cell
+            heappush(searchq, (end_map[index], cost, index))
+        while searchq:
+            estimate, dist, index = heappop(searchq)
+            if estimate == inf:
+                break
+            if dist > best[index]:
+                continue
+            if index in end_wall:
+                return dist
+            for next_index in neighbors[index]:
+                cell = cells[next_index]
+                if next_index == blocked or (cell != 0 and cell != player):
+                    continue
+                cost = 0 if cell == player else 1
+                if dist + cost < best.get(next_index, inf):
+                    best[next_index] = dist + cost
+                    heappush(searchq, (dist + end_map[next_index], dist + cost, next_index))
+        return inf
+
     def get_value(self, board, debug=False):
         if board.winner != 0:
             return board.winner * inf
@@ -108,6 +247,42 @@ class ShortestPathHeuristic(Heuristic):
 # finds out which player has the shorter remaining path using "Two Distance"
 # which picks the second best options as it moves across the board
 class TwoDistanceHeuristic(Heuristic):
+    def __init__(self, incremental=False):
+        # reuse the searches of the parent position for the children they don't depend on
+        self.incremental = incremental
+
+    # in incremental mode, the parent's searches remember which cells they depended on, and the children that
+    # don't touch those cells reuse the parent's distance as is
+    # the mover's search depends on every cell it looked at, since a new stone of its own would extend it
+    # the opponent's search only depends on the cells it expanded, since a blocked cell that was never taken off
+    # the queue can't change the order of the cells that were
+    def child_evaluator(self, board):
+        if not self.incremental or board.winner != 0:
+            return super(TwoDistanceHeuristic, self).child_evaluator(board)
+
+        dist = dict()
+        looked_at = dict()
+        for player in (1, -1):
+            expanded = []
+            dist[player] = self.two_distance(board, player, expanded=expanded)
+            if player == board.turn:
+                # every cell next to an expanded cell was read by the search
+                looked_at[player] = {(row + dy, col + dx) for row, col in expanded for dy, dx in ADJACENT}
+            else:
+                looked_at[player] = set(expanded)
+
+        def evaluate(row, col):
+            board.play(row, col)
+            if board.winner != 0:
+                value = board.winner * inf
+            else:
+                p1_dist = self.two_distance(board, 1) if (row, col) in looked_at[1] else dist[1]
+                p2_dist = self.two_distance(board, -1) if (row, col) in looked_at[-1] else dist[-1]
+                value = self.combine(board, p1_dist, p2_dist)
+            board.undo()
+            return value
+        return evaluate
+
     def get_value(self, board, debug=False):
         if board.winner != 0:
             return board.winner * inf
@@ -115,21 +290,26 @@ class TwoDistanceHeuristic(Heuristic):
             # find the player that's closer to winning
             p1_dist = self.two_distance(board, 1, debug=debug)
             p2_dist = self.two_distance(board, -1, debug=debug)
-            val = p2_dist - p1_dist
-            # if a player does not have a 2-distance path, pick a high finite number, so we dont confuse it with a
-            # definite win or a definite loss
-            if math.isinf(val):
-                val = int(math.copysign(100, val))
-                fallback = ShortestPathHeuristic()
-                val += fallback.get_value(board)
-            if math.isnan(val):
-                # if neither player has a path to their opposite side, we get nan
-                # in this rare case, revert to normal distance
-                fallback = ShortestPathHeuristic()
-                val = fallback.get_value(board)
-            return val
-
-    def two_distance(self, board, player, debug=False):
+            return self.combine(board, p1_dist, p2_dist)
+
+    # turns the two distances into a board value
+    def combine(self, board, p1_dist, p2_dist):
+        val = p2_dist - p1_dist
+        # if a player does not have a 2-distance path, pick a high finite number, so we dont confuse it with a
+        # definite win or a definite loss
+        if math.isinf(val):
+            val = int(math.copysign(100, val))
+            fallback = ShortestPathHeuristic()
+            val += fallback.get_value(board)
+        if math.isnan(val):
+            # if neither player has a path to their opposite side, we get nan
+            # in this rare case, revert to normal distance
+            fallback = ShortestPathHeuristic()
+            val = fallback.get_value(board)
+        return val
+
+    # if expanded is a list, every cell taken off the search queue is added to it
+    def two_distance(self, board, player, debug=False, expanded=None):
         # search ordered by min distance, intended direction, then perpendicular direction
         if player == 1:
             searchq = [(0, board.size, i, board.size, (i, board.size)) for i in range(-1, board.size)]
@@ -149,6 +329,8 @@ class TwoDistanceHeuristic(Heuristic):
         connected = False
         while searchq:
             dist, weight, row, col, neighbor = heappop(searchq)
+            if expanded is not None:
+                expanded.append((row, col))
 
             # if the main axis is at 0, we've crossed the whole board
             if weight == 0:
@@ -199,6 +381,221 @@ class TwoDistanceHeuristic(Heuristic):
             return inf
 
 
+# treats the board as a network of resistors, in the style of Shannon's and Anshelevich's hex machines
+# each cell is a resistor that is cheap for the player's own stones, normal when empty, and nearly open for the
+# opponent's stones. a voltage across the player's walls then drives a current that is high when the player has
+# many short and independent paths, so the log of the ratio of the two currents is the board value
+class ResistanceHeuristic(Heuristic):
+    # the resistance of a cell for each kind of owner
+    own_resistance = 0.01
+    empty_resistance = 1.0
+    opponent_resistance = 10000.0
+    # the banded structure of the network for each board size, which every position of that size shares
+    _structures = dict()
+
+    def __init__(self, incremental=True):
+        # value children with low rank updates of the parent's factorization, instead of one solve per child
+        self.incremental = incremental
+
+    def get_value(self, board, debug=False):
+        if board.winner != 0:
+            return board.winner * inf
+        cells = [value for row in board.board for value in row]
+        current = dict()
+        for player in (1, -1):
+            matrix, source = self.assemble(cells, board.size, player)
+            factor = self.factorize(matrix, board.size)
+            voltage = self.solve(factor, source, board.size)
+            current[player] = sum(source) - sum(s * v for s, v in zip(source, voltage))
+        return math.log(current[1] / current[-1])
+
+    # the children's values come from the parent's factorization. a stone only changes the resistors around one
+    # cell, which is an update of rank 7 at most, so the woodbury identity gives each child's current from a small
+    # dense solve, using the entries of the inverse matrix near the cell
+    def child_evaluator(self, board):
+        if not self.incremental or board.winner != 0:
+            return super(ResistanceHeuristic, self).child_evaluator(board)
+
+        size = board.size
+        structure = ResistanceHeuristic.structure(size)
+        cells = [value for row in board.board for value in row]
+        networks = dict()
+        for player in (1, -1):
+            matrix, source = self.assemble(cells, size, player)
+            factor = self.factorize(matrix, size)
+            voltage = self.solve(factor, source, size)
+            inverse = self.selected_inverse(factor, size)
+            networks[player] = (source, voltage, inverse, sum(source), sum(s * v for s, v in zip(source, voltage)))
+        mover = board.turn
+
+        def evaluate(row, col):
+            board.play(row, col)
+            winner = board.winner
+            board.undo()
+            if winner != 0:
+                return winner * inf
+            index = row * size + col
+            current = dict()
+            for player in (1, -1):
+                source, voltage, inverse, source_total, flow = networks[player]
+                old = self.resistance(0, player)
+                new = self.resistance(mover, player)
+                current[player] = self.updated_current(structure, cells, player, index, old, new,
+                                                       source, voltage, inverse, source_total, flow)
+            return math.log(current[1] / current[-1])
+        return evaluate
+
+    @staticmethod
+    def resistance(cell, player):
+        if cell == 0:
+            return ResistanceHeuristic.empty_resistance
+        elif cell == player:
+            return ResistanceHeuristic.own_resistance
+        return ResistanceHeuristic.opponent_resistance
+
+    # cells are numbered row by row, so every connection is at most size cells from the diagonal
+    # the structure holds that bandwidth, the lower neighbours of each cell, and which cells touch each wall
+    @staticmethod
+    def structure(size):
+        if size not in ResistanceHeuristic._structures:
+            neighbors = neighbor_indices(size)
+            ResistanceHeuristic._structures[size] = {
+                'band': size,
+                'neighbors': neighbors,
+                'lower': [[j for j in neighbors[i] if j < i] for i in range(size * size)],
+                'walls': {player: tuple(set(wall) for wall in wall_indices(size, player)) for player in (1, -1)},
+            }
+        return ResistanceHeuristic._structures[size]
+
+    # builds the node voltage equations with the source wall at 1 volt and the sink wall at 0 volts
+    # the matrix is stored by row as [diagonal, entry one left of it, two left, ...] out to the bandwidth
+    def assemble(self, cells, size, player):
+        structure = ResistanceHeuristic.structure(size)
+        band = structure['band']
+        source_wall, sink_wall = structure['walls'][player]
+        resistance = [self.resistance(cell, player) for cell in cells]
+        matrix = [[0.0] * (band + 1) for _ in cells]
+        source = [0.0] * len(cells)
+        for i, lower in enumerate(structure['lower']):
+            for j in lower:
+                conductance = 1 / (resistance[i] + resistance[j])
+                matrix[i][i - j] -= conductance
+                matrix[i][0] += conductance
+                matrix[j][0] += conductance
+            if i in source_wall:
+                source[i] = 1 / resistance[i]
+                matrix[i][0] += source[i]
+            if i in sink_wall:
+                matrix[i][0] += 1 / resistance[i]
+        return matrix, source
+
+    # a banded LDL^T factorization. returns the rows of L in the same layout as the matrix, and the diagonal D
+    @staticmethod
+    def factorize(matrix, size):
+        band = ResistanceHeuristic.structure(size)['band']
+        lower = []
+        diagonal = []
+        for i, row in enumerate(matrix):
+            start = max(0, i - band)
+            factor_row = [1.0] + [0.0] * band
+            for j in range(start, i):
+                total = row[i - j]
+                other = lower[j]
+                for k in range(max(start, j - band), j):
+                    total -= factor_row[i - k] * other[j - k] * diagonal[k]
+                factor_row[i - j] = total / diagonal[j]
+            diagonal.append(row[0] - sum(factor_row[i - k] ** 2 * diagonal[k] for k in range(start, i)))
+            lower.append(factor_row)
+        return lower, diagonal
+
+    @staticmethod
+    def solve(factor, rhs, size):
+        band = ResistanceHeuristic.structure(size)['band']
+        lower, diagonal = factor
+        count = len(rhs)
+        x = list(rhs)
+        for i in range(count):
+            row = lower[i]
+            x[i] -= sum(row[i - k] * x[k] for k in range(max(0, i - band), i))
+        for i in range(count):
+            x[i] /= diagonal[i]
+        for i in range(count - 1, -1, -1):
+            x[i] -= sum(lower[k][k - i] * x[k] for k in range(i + 1, min(count, i + band + 1)))
+        return x
+
+    # the entries of the inverse matrix within twice the bandwidth of the diagonal, using the takahashi recurrence
+    # that covers every pair of cells within two steps of each other, which is all an update around one cell needs
+    # stored by row as [diagonal, one right of it, two right, ...]
+    @staticmethod
+    def selected_inverse(factor, size):
+        band = ResistanceHeuristic.structure(size)['band']
+        wide = 2 * band
+        lower, diagonal = factor
+        count = len(diagonal)
+        inverse = [None] * count
+        for i in range(count - 1, -1, -1):
+            row = [0.0] * (wide + 1)
+            inverse[i] = row
+            below = range(i + 1, min(count, i + band + 1))
+            for j in range(min(count - 1, i + wide), i - 1, -1):
+                total = 1 / diagonal[i] if i == j else 0.0
+                for k in below:
+                    entry = inverse[k][j - k] if k <= j else (row[k - i] if j == i else inverse[j][k - j])
+                    total -= lower[k][k - i] * entry
+                row[j - i] = total
+        return inverse
+
+    # the current through the network once the resistance of one cell changes
+    @staticmethod
+    def updated_current(structure, cells, player, index, old, new, source, voltage, inverse, source_total, flow):
+        def z(i, j):
+            if i > j:
+                i, j = j, i
+            return inverse[i][j - i]
+
+        # every changed resistor is a column of the update, either a cell-to-cell connection or a wall connection
+        columns = []
+        for neighbor in structure['neighbors'][index]:
+            other = ResistanceHeuristic.resistance(cells[neighbor], player)
+            columns.append((neighbor, 1 / (other + new) - 1 / (other + old)))
+        source_wall, sink_wall = structure['walls'][player]
+        source_change = 1 / new - 1 / old if index in source_wall else 0.0
+        wall_change = source_change + (1 / new - 1 / old if index in sink_wall else 0.0)
+        if wall_change:
+            columns.append((None, wall_change))
+
+        # the column vectors dotted with a vector, given the vector's entries at the cell and its neighbours
+        def project(values, neighbor):
+            return values[index] if neighbor is None else values[neighbor] - values[index]
+
+        # x is the parent's inverse applied to the new source vector, around the cell
+        nearby = [index] + structure['neighbors'][index]
+        x = {i: voltage[i] + source_change * z(i, index) for i in nearby}
+        projected = [project(x, neighbor) for neighbor, _ in columns]
+        rank = len(columns)
+        system = []
+        for p, (neighbor_p, change_p) in enumerate(columns):
+            column_inverse = {i: (z(i, index) if neighbor_p is None else z(i, neighbor_p) - z(i, index))
+                              for i in nearby}
+            system.append([float(p == q) + change_p * project(column_inverse, neighbor_q)
+                           for q, (neighbor_q, _) in enumerate(columns)] + [change_p * projected[p]])
+        # gaussian elimination on the small dense system
+        for p in range(rank):
+            pivot = max(range(p, rank), key=lambda r: abs(system[r][p]))
+            system[p], system[pivot] = system[pivot], system[p]
+            for r in range(p + 1, rank):
+                scale = system[r][p] / system[p][p]
+                for q in range(p, rank + 1):
+                    system[r][q] -= scale * system[p][q]
+        solution = [0.0] * rank
+        for p in range(rank - 1, -1, -1):
+            solution[p] = (system[p][rank] - sum(system[p][q] * solution[q] for q in range(p + 1, rank))) / system[p][p]
+
+        new_flow = (flow + 2 * source_change * voltage[index] + source_change ** 2 * z(index, index)
+                    - sum(a * b for a, b in zip(projected, solution)))
+        return source_total + source_change - new_flow
+
+
 # unused class. Supposed to remember values from previous searches to aid search
 class PastResultHeuristic(Heuristic):
     def __init__(self, results, fallback=None):
@@ -206,7 +603,7 @@ class PastResultHeuristic(Heuristic):
         self.fallback = fallback
 
     def get_value(self, board, debug=False):
-        board_hash = board.hashable()
+        board_hash = board.key
         if board_hash in self.results:
             return self.results[board_hash][0]
         elif self.fallback:
@@ -217,62 +614,72 @@ class PastResultHeuristic(Heuristic):
 
 # Treats stones as positive/negative charges, and tries to find sadle points in the field
 # supposed to represent choosing contested moves
+# the field is kept as a flat array of (size+2)² charges, with a border of one cell for the walls
 class ChargeHeuristic(Heuristic):
     _max_charge = 9
+    # precomputed inverse-square kernels and wall charges, shared by every instance of the same size
+    _kernels = dict()
+    _base_charges = dict()
 
     def __init__(self, size):
         super(ABC, self).__init__()
-        self._base_charge = self.base_charge(size)
+        self._base_charge = ChargeHeuristic.base_charge(size)
         self.size = size
+        # the move played at each ply and the charge field after it, for reuse while the game follows the same line
         self.states = []
 
     # finds an approximation of "curvature" if the board was an electric field
     def get_child_values(self, board, debug=False):
         same_moves = 0
         for move, state in zip(board.move_list, self.states):
-            if move == state[0][-1]:
-                same_moves += 1
+            if move != state[0]:
+                break
+            same_moves += 1
         if same_moves == 0:
-            charge = deepcopy(self._base_charge)
+            charge = array('d', self._base_charge)
         else:
-            charge = deepcopy(self.states[same_moves-1][1])
+            charge = array('d', self.states[same_moves-1][1])
         # remove the incorrect values
-        self.states = self.states[:same_moves]
+        del self.states[same_moves:]
 
         for i in range(same_moves, len(board.move_list)):
             y, x = board.move_list[i]
             # if they swapped, clear the board and mirror the first move
             if (y,x) == SWAP_MOVE:
-                charge = deepcopy(self._base_charge)
+                charge = array('d', self._base_charge)
                 x, y = board.move_list[0]
             ChargeHeuristic.add_charge(board[y][x], charge, x, y)
-
-            self.states.append((board.move_list[:i+1], charge))
-            # copy the board so the one stored isnt modified
-            if i+1 < len(board.move_list):
-                charge = deepcopy(charge)
-
-        # for row in charge:
-        #     print(list((('%.4f'%x) if x >= 0 else ('%.3f'%x) for x in row)))
-        curve = [[0] * board.size for i in range(board.size)]
-        for y, x in itertools.product(range(1, board.size + 1), repeat=2):
-            k_e_w = ChargeHeuristic.curve(charge[y][x - 1], charge[y][x], charge[y][x + 1])
-            k_ne_sw = ChargeHeuristic.curve(charge[y + 1][x - 1], charge[y][x], charge[y - 1][x + 1])
-            k_nw_se = ChargeHeuristic.curve(charge[y + 1][x], charge[y][x], charge[y - 1][x])
-            curve[y - 1][x - 1] = min(k_e_w, k_ne_sw, k_nw_se) * max(k_e_w, k_ne_sw, k_nw_se)*-board.turn
-            # print('%.3f'%curve[y-1][x-1], end=',' if x < board.size else '\n')
-        return curve
-
+            # keep a copy, so the stored field isnt modified by later moves
+            self.states.append((board.move_list[i], array('d', charge)))
+
+        # the three curvatures of every cell are taken from shifted slices of the rows above, at and below it
+        dim = board.size + 2
+        turn = -board.turn
+        curve = ChargeHeuristic.curve
+        values = []
+        for y in range(1, board.size + 1):
+            above = charge[(y - 1) * dim:y * dim]
+            row = charge[y * dim:(y + 1) * dim]
+            below = charge[(y + 1) * dim:(y + 2) * dim]
+            values.append([min(k_e_w, k_ne_sw, k_nw_se) * max(k_e_w, k_ne_sw, k_nw_se) * turn
+                           for k_e_w, k_ne_sw, k_nw_se in
+                           zip(map(curve, row[:-2], row[1:-1], row[2:]),
+                               map(curve, below[:-2], row[1:-1], above[2:]),
+                               map(curve, below[1:-1], row[1:-1], above[1:-1]))])
+        return values
+
+    # the field of a board with no stones on it, where the walls act as lines of charge
     @staticmethod
     def base_charge(size):
-        base = [[0] * (size + 2) for y in range(size + 2)]
-        # treat the end zones as lines of charge
-        for i in range(size):
-            ChargeHeuristic.add_charge(1, base, -1, i)
-            ChargeHeuristic.add_charge(1, base, size, i)
-            ChargeHeuristic.add_charge(-1, base, i, -1)
-            ChargeHeuristic.add_charge(-1, base, i, size)
-        return base
+        if size not in ChargeHeuristic._base_charges:
+            base = array('d', [0]) * ((size + 2) ** 2)
+            for i in range(size):
+                ChargeHeuristic.add_charge(1, base, -1, i)
+                ChargeHeuristic.add_charge(1, base, size, i)
+                ChargeHeuristic.add_charge(-1, base, i, -1)
+                ChargeHeuristic.add_charge(-1, base, i, size)
+            ChargeHeuristic._base_charges[size] = base
+        return array('d', ChargeHeuristic._base_charges[size])
 
     @staticmethod
     def distance(x1, y1, x2, y2):
@@ -280,18 +687,36 @@ class ChargeHeuristic(Heuristic):
         diagonal = abs(x2 - x1) + abs(y2 - y1 + (x2 - x1))
         return min(manhattan, diagonal)
 
+    # the charge a stone adds to every cell around it, for every offset that fits on a dim x dim field
+    # the centre is infinite so that it always clips to the maximum charge
+    @staticmethod
+    def kernel(dim):
+        if dim not in ChargeHeuristic._kernels:
+            span = 2 * dim - 1
+            kernel = array('d', [0]) * (span * span)
+            for dy, dx in itertools.product(range(1 - dim, dim), repeat=2):
+                if (dy, dx) == (0, 0):
+                    strength = inf
+                else:
+                    strength = 1 / ChargeHeuristic.distance(0, 0, dx, dy) ** 2
+                kernel[(dy + dim - 1) * span + dx + dim - 1] = strength
+            ChargeHeuristic._kernels[dim] = kernel
+        return ChargeHeuristic._kernels[dim]
+
+    # adds a stone's charge to a flat field, one row slice at a time. cells at the maximum charge stay fixed
     @staticmethod
     def add_charge(sign, charge, x, y):
-        x += 1
-        y += 1
-        for y2, x2 in itertools.product(range(len(charge)), repeat=2):
-            if abs(charge[y2][x2]) == ChargeHeuristic._max_charge:
-                continue
-            if (y2, x2) == (y, x):
-                charge[y2][x2] = sign * ChargeHeuristic._max_charge
-            else:
-                charge[y2][x2] += sign * (1 / ChargeHeuristic.distance(x, y, x2, y2) ** 2)
-            charge[y2][x2] = max(min(charge[y2][x2], ChargeHeuristic._max_charge), -ChargeHeuristic._max_charge)
+        max_charge = ChargeHeuristic._max_charge
+        dim = int(round(len(charge) ** 0.5))
+        span = 2 * dim - 1
+        kernel = ChargeHeuristic.kernel(dim)
+        # the kernel cell that lands on (0, 0) of the field
+        corner = (dim - 1 - y - 1) * span + dim - 1 - x - 1
+        for row in range(0, len(charge), dim):
+            offset = corner + row // dim * span
+            charge[row:row + dim] = array('d', [
+                c if c == max_charge or c == -max_charge else max(min(c + sign * k, max_charge), -max_charge)
+                for c, k in zip(charge[row:row + dim], kernel[offset:offset + dim])])
 
     @staticmethod
     def inverse_radius(h1, h2, h3):
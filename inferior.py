@@ -0,0 +1,137 @@
+"""
+Inferior cell analysis: empty cells that can be left out of the search, found from the ring of cells around them
+A dead cell can't change who wins, whoever takes it. A captured cell can be given to one player for free,
+and a dominated cell is never a better move than the cell that kills it
+"""
+from board import ADJACENT
+
+_rings = dict()
+
+
+# the six cells around every cell, in order, so that each one is next to the one after it
+# cells off the board are replaced by the player whose wall they're behind, 1 for left and right, -1 for top and bottom
+def rings(size):
+    if size not in _rings:
+        table = []
+        for row in range(size):
+            for col in range(size):
+                ring = []
+                for dy, dx in ADJACENT:
+                    y, x = row + dy, col + dx
+                    if not 0 <= y < size:
+                        ring.append(-1)
+                    elif not 0 <= x < size:
+                        ring.append(1)
+                    else:
+                        ring.append((y, x))
+                table.append(ring)
+        _rings[size] = table
+    return _rings[size]
+
+
+# the owner of each cell around a cell, with extra cells pretended to be taken
+def _ring_owners(board, row, col, extra):
+    owners = []
+    for cell in rings(board.size)[row * board.size + col]:
+        if type(cell) is int:
+            owners.append(cell)
+        elif cell in extra:
+            owners.append(extra[cell])
+        else:
+            owners.append(board[cell[0]][cell[1]])
+    return owners
+
+
+# a cell is useless to a player if every path of theirs through it can go around it instead, through cells of the
+# ring they already own. paths only come in through ring cells the opponent doesn't own
+def _useless(owners, player):
+    usable = [i for i in range(6) if owners[i] != -player]
+    for a in range(len(usable)):
+        for b in range(a + 1, len(usable)):
+            i, j = usable[a], usable[b]
+            if not (all(owners[k] == player for k in range(i + 1, j)) or
+                    all(owners[k % 6] == player for k in range(j + 1, i + 6))):
+                return False
+    return True
+
+
+# a dead cell is useless to both players, so its colour can't change who wins
+def is_dead(board, row, col, extra=None):
+    owners = _ring_owners(board, row, col, extra or {})
+    return _useless(owners, 1) and _useless(owners, -1)
+
+
+def _empty_cells(board):
+    return [(row, col) for row in range(board.size) for col in range(board.size) if board[row][col] == 0]
+
+
+def dead_cells(board):
+    return [cell for cell in _empty_cells(board) if is_dead(board, *cell)]
+
+
+# pairs of neighbouring empty cells where the player can answer a move in either with the other, which kills it
+# both cells can then be given to the player without changing who wins
+def captured_cells(board, player):
+    captured = set()
+    size = board.size
+    for row, col in _empty_cells(board):
+        for cell in rings(size)[row * size + col]:
+            if type(cell) is int or board[cell[0]][cell[1]] != 0 or cell <= (row, col):
+                continue
+            if is_dead(board, row, col, {cell: player}) and is_dead(board, cell[0], cell[1], {(row, col): player}):
+                captured.add((row, col))
+                captured.add(cell)
+    return captured
+
+
+# fills every dead and captured cell, without using any turns, until there are none left
+# the filled stones aren't in the move list and can't be undone, so this is meant for copies of a board
+# returns the number of cells filled
+def fill_inferior(board):
+    filled = 0
+    changed = True
+    while changed and board.winner == 0:
+        changed = False
+        for row, col in dead_cells(board):
+            # a dead cell can go to either player. it goes to the player whose turn it isn't
+            board.fill(row, col, -board.turn)
+            filled += 1
+            changed = True
+        for player in (board.turn, -board.turn):
+            for row, col in sorted(captured_cells(board, player)):
+                if board[row][col] == 0:
+                    board.fill(row, col, player)
+                    filled += 1
+                    changed = True
+    return filled
+
+
+# the empty cells worth playing for the player to move: not dead, not captured by either player,
+# and not dominated. a cell is dominated if an opponent stone on a neighbour would kill it, because then the
+# neighbour is at least as good a move. a dominated cell is only dropped while the cell that dominates it is kept
+def candidate_moves(board):
+    player = board.turn
+    size = board.size
+    moves = []
+    inferior = set(dead_cells(board)) | captured_cells(board, 1) | captured_cells(board, -1)
+    dropped = set(inferior)
+    for row, col in _empty_cells(board):
+        if (row, col) in inferior:
+            continue
+        for cell in rings(size)[row * size + col]:
+            if type(cell) is int or board[cell[0]][cell[1]] != 0 or cell in dropped:
+                continue
+            if is_dead(board, row, col, {cell: -player}):
+                dropped.add((row, col))
+                break
+        else:
+            moves.append((row, col))
+    return moves
+
+
+# removes the inferior cells from a list of moves. if the analysis leaves nothing to play, the game is already
+# decided, and every move is kept
+def filter_moves(board, moves):
+    candidates = set(candidate_moves(board))
+    kept = [move for move in moves if move in candidates or not board.in_bounds(*move)]
+    return kept or moves
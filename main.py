@@ -1,8 +1,13 @@
 from timeit import default_timer
 
 from board import HexBoard
-from heuristic import TwoDistanceHeuristic, ShortestPathHeuristic, ChargeHeuristic
-from player import TextPlayer, RandomPlayer, AlphaBetaPlayer, ChargeHeuristicPlayer, GuiPlayer, MonteCarloPlayer
+from bitboard import BitHexBoard
+from vc import VCEngine
+from heuristic import TwoDistanceHeuristic, ShortestPathHeuristic, ChargeHeuristic, ResistanceHeuristic
+from player import TextPlayer, RandomPlayer, AlphaBetaPlayer, ChargeHeuristicPlayer, GuiPlayer, MonteCarloPlayer, \
+    SolverPlayer
+from solver import DFPNSolver
+from book import OpeningBook
 import time
 from GUI import main as gui_main
 
@@ -37,36 +42,36 @@ DEFAULTS = [
         'size': 11,
         'swap': 'n',
         'players': [None,
-                    AlphaBetaPlayer(1, ShortestPathHeuristic(), 2, sorter=ChargeHeuristic(11)),
-                    AlphaBetaPlayer(-1, ShortestPathHeuristic(), 2, sorter=ChargeHeuristic(11))]
+                    AlphaBetaPlayer(1, ShortestPathHeuristic(incremental=True), 2, sorter=ChargeHeuristic(11)),
+                    AlphaBetaPlayer(-1, ShortestPathHeuristic(incremental=True), 2, sorter=ChargeHeuristic(11))]
     },
     {
         'size': 11,
         'swap': 'n',
         'players': [None,
-                    AlphaBetaPlayer(1, TwoDistanceHeuristic(), 2),
-                    AlphaBetaPlayer(-1, TwoDistanceHeuristic(), 2)]
+                    AlphaBetaPlayer(1, TwoDistanceHeuristic(incremental=True), 2),
+                    AlphaBetaPlayer(-1, TwoDistanceHeuristic(incremental=True), 2)]
     },
     {
         'size':11,
         'swap':'n',
         'players': [None,
-                    AlphaBetaPlayer(1, ShortestPathHeuristic(), 2, sorter=ChargeHeuristic(11)),
-                    AlphaBetaPlayer(-1, TwoDistanceHeuristic(), 2, sorter=ChargeHeuristic(11))]
+                    AlphaBetaPlayer(1, ShortestPathHeuristic(incremental=True), 2, sorter=ChargeHeuristic(11)),
+                    AlphaBetaPlayer(-1, TwoDistanceHeuristic(incremental=True), 2, sorter=ChargeHeuristic(11))]
     },
     {
         'size': 7,
         'swap': 'n',
         'players': [None,
                     GuiPlayer(1),
-                    AlphaBetaPlayer(-1, TwoDistanceHeuristic(), 3, sorter=ChargeHeuristic(7))]
+                    AlphaBetaPlayer(-1, TwoDistanceHeuristic(incremental=True), 3, sorter=ChargeHeuristic(7))]
     },
     {
         'size':11,
         'swap':'n',
         'players': [None,
                     GuiPlayer (1),
-                    AlphaBetaPlayer(-1, TwoDistanceHeuristic(), 2, sorter=ChargeHeuristic(11))]
+                    AlphaBetaPlayer(-1, TwoDistanceHeuristic(incremental=True), 2, sorter=ChargeHeuristic(11))]
     },
 ]
 
@@ -90,6 +95,13 @@ def text_get_rules(default=0):
             swap = DEFAULTS[default]['swap']
     swap = (swap == 'y')
 
+    # the bitboard backend is faster for the bots, but behaves the same
+    bitboard = 'n'
+    if not default:
+        bitboard = None
+        while bitboard not in ('y', 'n'):
+            bitboard = input('use bitboard backend? (y/n): ')
+
     if not default:
         player = [None] * 3
     else:
@@ -98,11 +110,12 @@ def text_get_rules(default=0):
         if player[i] is not None:
             continue
         player_type = -1
-        while not (0 <= player_type <= 5):
+        while not (0 <= player_type <= 6):
             try:
                 player_type = int(input(
                     '0 - Text\n1 - Gui\n2 - Random (AI)\n3 - Alpha-Beta Search (AI)\n'
-                    '4 - Monte-Carlo Search (AI)\n5 - Charge Heuristic (AI)\nplayer %d type?: ' % (
+                    '4 - Monte-Carlo Search (AI)\n5 - Charge Heuristic (AI)\n6 - Proof-Number Solver (AI)\n'
+                    'player %d type?: ' % (
                                 i % 3)))
             except ValueError:
                 pass
@@ -118,8 +131,13 @@ def text_get_rules(default=0):
             player[i] = build_monte_carlo_player(i, size)
         elif player_type == 5:
             player[i] = ChargeHeuristicPlayer(i, size)
+        elif player_type == 6:
+            player[i] = build_solver_player(i)
 
-    board = HexBoard(size, swap)
+    if bitboard == 'y':
+        board = BitHexBoard(size, swap)
+    else:
+        board = HexBoard(size, swap)
     return board, player
 
 
@@ -127,15 +145,17 @@ def text_get_rules(default=0):
 def build_alpha_beta_player(player_num, size):
     heuristic_type = -1
     heuristic = None
-    while not (0 <= heuristic_type <= 1):
+    while not (0 <= heuristic_type <= 2):
         try:
-            heuristic_type = int(input('0 - Shortest Path\n1 - Two Distance\nheuristic type?: '))
+            heuristic_type = int(input('0 - Shortest Path\n1 - Two Distance\n2 - Resistance\nheuristic type?: '))
         except ValueError:
             pass
     if heuristic_type == 0:
-        heuristic = ShortestPathHeuristic()
+        heuristic = ShortestPathHeuristic(incremental=True)
     elif heuristic_type == 1:
-        heuristic = TwoDistanceHeuristic()
+        heuristic = TwoDistanceHeuristic(incremental=True)
+    elif heuristic_type == 2:
+        heuristic = ResistanceHeuristic()
     use_sort = None
     sorter = None
     while use_sort not in ('y', 'n'):
@@ -161,7 +181,43 @@ def build_alpha_beta_player(player_num, size):
             killer_moves = int(input('number of killer-moves?: '))
         except ValueError:
             pass
-    return AlphaBetaPlayer(player_num, heuristic, search_depth, max_time, sorter, killer_moves)
+    workers = 0
+    while workers < 1:
+        try:
+            workers = int(input('number of search processes? (1 for a single process): '))
+        except ValueError:
+            pass
+    use_pvs = None
+    while use_pvs not in ('y', 'n'):
+        use_pvs = input('use principal variation search? (y/n): ')
+    aspiration = -1
+    while search_depth < 0 and aspiration < 0:
+        try:
+            aspiration = float(input('aspiration window width? (0 for none): '))
+        except ValueError:
+            pass
+    prune = None
+    while prune not in ('y', 'n'):
+        prune = input('leave dead and captured cells out of the search? (y/n): ')
+    use_vc = None
+    while use_vc not in ('y', 'n'):
+        use_vc = input('use virtual connections to prune moves? (y/n): ')
+    use_solver = None
+    while use_solver not in ('y', 'n'):
+        use_solver = input('solve the endgame exactly? (y/n): ')
+    canonical = None
+    while canonical not in ('y', 'n'):
+        canonical = input('share table entries between mirror image positions? (y/n): ')
+    book = build_book()
+    lazy_smp = None
+    if workers > 1 and search_depth < 0:
+        while lazy_smp not in ('y', 'n'):
+            lazy_smp = input('run a full search in every process (lazy smp)? (y/n): ')
+    return AlphaBetaPlayer(player_num, heuristic, search_depth, max_time, sorter, killer_moves, workers=workers,
+                           lazy_smp=lazy_smp == 'y', pvs=use_pvs == 'y', aspiration=max(aspiration, 0),
+                           vc_engine=VCEngine() if use_vc == 'y' else None, prune=prune == 'y',
+                           solver=DFPNSolver(max_nodes=20000) if use_solver == 'y' else None, book=book,
+                           canonical=canonical == 'y')
 
 
 # Unused monte-carlo player builder - This method is staying for potential future development (if we ever add a monte-
@@ -173,7 +229,73 @@ def build_monte_carlo_player(player_num, size):
             max_time = int(input('max time per move?: '))
         except ValueError:
             pass
-    return MonteCarloPlayer(player_num, size, max_time)
+    num_samples = 0
+    while num_samples < 1:
+        try:
+            num_samples = int(input('number of rollouts per leaf?: '))
+        except ValueError:
+            pass
+    prune = None
+    while prune not in ('y', 'n'):
+        prune = input('leave dead and captured cells out of the search? (y/n): ')
+    use_rave = None
+    while use_rave not in ('y', 'n'):
+        use_rave = input('use all-moves-as-first statistics (rave)? (y/n): ')
+    max_memory = -1
+    while max_memory < 0:
+        try:
+            max_memory = int(input('search tree memory in MB? (0 for a million nodes): '))
+        except ValueError:
+            pass
+    workers = 0
+    while workers < 1:
+        try:
+            workers = int(input('number of search processes? (1 for a single process): '))
+        except ValueError:
+            pass
+    root_parallel = None
+    if workers > 1:
+        while root_parallel not in ('y', 'n'):
+            root_parallel = input('grow a separate tree in every process (root parallel)? (y/n): ')
+    use_prior = None
+    while use_prior not in ('y', 'n'):
+        use_prior = input('guide new nodes with charge heuristic priors? (y/n): ')
+    rollout_depth = -1
+    while rollout_depth < 0:
+        try:
+            rollout_depth = int(input('moves to play before scoring a rollout with a heuristic? (0 to play out): '))
+        except ValueError:
+            pass
+    return MonteCarloPlayer(player_num, size, max_time, num_samples, prune=prune == 'y', book=build_book(),
+                            rave=use_rave == 'y', max_memory=max_memory * 2**20 if max_memory else None,
+                            workers=workers, root_parallel=root_parallel == 'y',
+                            prior=ChargeHeuristic(size) if use_prior == 'y' else None, rollout_depth=rollout_depth)
+
+
+# asks for an opening book file, made with book.py. a blank answer means no book
+def build_book():
+    while True:
+        path = input('opening book file? (leave blank for none): ')
+        if not path:
+            return None
+        try:
+            return OpeningBook(path)
+        except (OSError, ValueError) as error:
+            print(error)
+
+
+# the solver proves positions exactly, and plays its most promising move when it runs out of time
+def build_solver_player(player_num):
+    max_time = 0
+    while max_time <= 0:
+        try:
+            max_time = int(input('max time per move?: '))
+        except ValueError:
+            pass
+    use_vc = None
+    while use_vc not in ('y', 'n'):
+        use_vc = input('use virtual connections? (y/n): ')
+    return SolverPlayer(player_num, max_time, vc_engine=VCEngine() if use_vc == 'y' else None)
 
 
 # Text-based UI
@@ -194,10 +316,6 @@ def text_game(board, player):
         if not (player[1].is_human() or player[2].is_human()):
             time.sleep(0.5)  # Add a small delay to make the game more viewable
 
-    # Force winner update to ensure winning path is calculated
-    if hasattr(board, '_update_winner'):
-        board._update_winner()
-        
     # Display the final board with the winning path
     board.pretty_print()
     print('Player', board.winner%3, 'Wins!')
@@ -218,10 +336,16 @@ def main(use_gui=True, default=0):
         if isinstance(p, GuiPlayer):
             has_gui_player = True
 
-    if has_gui_player or use_gui:
-        gui_main(board, player)
-    else:
-        text_game(board, player)
+    try:
+        if has_gui_player or use_gui:
+            gui_main(board, player)
+        else:
+            text_game(board, player)
+    finally:
+        # stop the players' worker processes, and give back any shared memory they made
+        for i in (1, -1):
+            if hasattr(player[i], 'close'):
+                player[i].close()
 #    import cProfile
 #    cProfile.run('text_game(use_default=True)', sort='time')
 
@@ -0,0 +1,700 @@
+"""
+Monte Carlo tree search over a fixed pool of nodes
+The statistics of every node are kept in parallel arrays, and the children of a node are one contiguous block of the
+pool, so the tree takes a predictable amount of memory and choosing a child never has to hash or copy a board
+"""
+import math
+import random
+from array import array
+from copy import deepcopy
+from heapq import heapify, heappush, heappop
+from timeit import default_timer
+
+from bitboard import BitHexBoard, get_layout
+from board import SWAP_MOVE, ConnectionTracker
+from inferior import filter_moves, fill_inferior
+
+# constants:
+# the move code of the root, which wasn't reached by a move. other moves are coded as row * size + col,
+# and the swap move as size * size
+NO_MOVE = -1
+# the bytes used by one node across all the arrays of the pool
+NODE_BYTES = 40
+# the number of batched rollouts that share one random pairing of the empty cells
+PAIRING_BITS = 64
+# prior heuristic values are standardised and clipped to this many standard deviations before the softmax
+PRIOR_LIMIT = 10
+
+
+# the nodes of a tree, stored as parallel arrays indexed by node number. node 0 is the root
+# blocks of children that are given back are kept in free lists by size, and handed out again before new nodes
+class NodePool:
+    __slots__ = ('capacity', 'used', 'top', 'free_blocks', 'visits', 'wins', 'amaf_visits', 'amaf_wins',
+                 'first_child', 'child_count', 'move', 'prior', 'parent')
+
+    def __init__(self, capacity=10**6):
+        self.capacity = capacity
+        # the number of nodes in the tree
+        self.used = 0
+        # nodes from top up have never been handed out
+        self.top = 0
+        # the first nodes of the free blocks, by the size of the block
+        self.free_blocks = dict()
+        # the number of simulations through each node
+        self.visits = array('I', bytes(4 * capacity))
+        # the number of those simulations won by the player who made the node's move
+        self.wins = array('d', bytes(8 * capacity))
+        # all-moves-as-first statistics: the number of rollouts through the parent in which the player who makes
+        # the node's move ended up with its cell, and how many of those they won
+        self.amaf_visits = array('I', bytes(4 * capacity))
+        self.amaf_wins = array('d', bytes(8 * capacity))
+        # the children of a node are the nodes first_child to first_child + child_count - 1.
+        # a child_count of 0 means the node hasn't been expanded
+        self.first_child = array('i', bytes(4 * capacity))
+        self.child_count = array('H', bytes(2 * capacity))
+        # the move code that leads to the node from its parent
+        self.move = array('h', bytes(2 * capacity))
+        # how good the move looked before it was searched, from 0 to 1
+        self.prior = array('f', bytes(4 * capacity))
+        # the node the node's move was played from. -1 for the root
+        self.parent = array('i', bytes(4 * capacity))
+
+    # forgets every node, without giving back the memory
+    def clear(self):
+        self.used = 0
+        self.top = 0
+        self.free_blocks.clear()
+
+    # moves the subtree under node to the front of the pool, with node as the new root, and forgets every other node.
+    # the subtree is copied in breadth first order, so each block of children stays contiguous
+    def compact(self, node):
+        order = array('i', [node])
+        first_child = array('i')
+        parent = array('i', [-1])
+        index = 0
+        while index < len(order):
+            old = order[index]
+            count = self.child_count[old]
+            if count:
+                first_child.append(len(order))
+                start = self.first_child[old]
+                order.extend(range(start, start + count))
+                parent.extend([index] * count)
+            else:
+                first_child.append(0)
+            index += 1
+        for name in ('visits', 'wins', 'amaf_visits', 'amaf_wins', 'child_count', 'move', 'prior'):
+            values = getattr(self, name)
+            values[:len(order)] = array(values.typecode, map(values.__getitem__, order))
+        self.first_child[:len(order)] = first_child
+        self.parent[:len(order)] = parent
+        self.move[0] = NO_MOVE
+        self.used = self.top = len(order)
+        self.free_blocks.clear()
+
+    # hands out a block of count fresh nodes and returns the first one, or -1 if there is no room for it
+    # a free block of the same size is used first, then new nodes, then the smallest free block that is bigger
+    def allocate(self, count):
+        blocks = self.free_blocks.get(count)
+        if blocks:
+            first = blocks.pop()
+        elif self.top + count <= self.capacity:
+            first = self.top
+            self.top += count
+        else:
+            bigger = [block_size for block_size, blocks in self.free_blocks.items() if block_size > count and blocks]
+            if not bigger:
+                return -1
+            block_size = min(bigger)
+            first = self.free_blocks[block_size].pop()
+            self.free_blocks.setdefault(block_size - count, []).append(first + count)
+        self.used += count
+        for node in range(first, first + count):
+            self.visits[node] = 0
+            self.wins[node] = 0
+            self.amaf_visits[node] = 0
+            self.amaf_wins[node] = 0
+            self.child_count[node] = 0
+            self.prior[node] = 0
+        return first
+
+    # gives back the children of a node, which must all be leaves, so the node is a leaf again
+    def release(self, node):
+        count = self.child_count[node]
+        self.free_blocks.setdefault(count, []).append(self.first_child[node])
+        self.child_count[node] = 0
+        self.used -= count
+
+
+# turns a move into its code, and back
+def encode(move, size):
+    if move == SWAP_MOVE:
+        return size * size
+    return move[0] * size + move[1]
+
+
+def decode(code, size):
+    if code == size * size:
+        return SWAP_MOVE
+    return divmod(code, size)
+
+
+# finishes games with random moves. a full Hex board always has exactly one winner, so the empty cells are shuffled
+# once and handed out in turn, and the winner is found with a single flood fill of player 1's stones at the end
+# the cells are shuffled in one scratch list that is reused by every rollout, and the board itself is never copied
+class RandomRollout:
+    __slots__ = ('layout', 'bits', 'cells')
+
+    def __init__(self):
+        self.layout = None
+        # the bit of every cell in the layout's masks, by flat index
+        self.bits = []
+        # the scratch list of empty cell bits
+        self.cells = []
+
+    def _resize(self, size):
+        self.layout = get_layout(size)
+        self.bits = [self.layout.bit(row, col) for row in range(size) for col in range(size)]
+
+    # returns the winner of the board after random play. the board isn't changed
+    def play(self, board):
+        if self.layout is None or self.layout.size != board.size:
+            self._resize(board.size)
+        layout = self.layout
+        cells = self.cells
+        cells.clear()
+        if isinstance(board, BitHexBoard):
+            stones = board.masks[1]
+            empty = board.empty
+            while empty:
+                low = empty & -empty
+                cells.append(low)
+                empty ^= low
+        else:
+            stones = 0
+            bits = self.bits
+            index = 0
+            for row in board.board:
+                for value in row:
+                    if value == 1:
+                        stones |= bits[index]
+                    elif value == 0:
+                        cells.append(bits[index])
+                    index += 1
+
+        random.shuffle(cells)
+        # the player to move gets every other cell, starting with the first. the cells are all different bits,
+        # so adding them is the same as or-ing them
+        stones += sum(cells[0::2] if board.turn == 1 else cells[1::2])
+        group = layout.flood(layout.left & stones, stones)
+        return 1 if group & layout.right else -1
+
+
+# plays many random rollouts of one board at once. every cell gets an integer with one bit per rollout, set where
+# player 1 owns the cell, so the cells of all the rollouts are handed out and flood filled with a few big integer
+# operations each, instead of one rollout at a time
+# a random fill gives the player to move ceil(empty / 2) random cells. the empty cells are shuffled and paired up,
+# and every rollout gives one cell of each pair to each player, which is the same as a uniformly random fill.
+# each group of PAIRING_BITS rollouts gets its own shuffle. the rollouts in a group are each uniformly random,
+# but a little correlated, so a batch is worth somewhat fewer independent rollouts than its size
+class BatchRollout:
+    __slots__ = ('size', 'neighbors', 'sweeps', 'empty', 'words')
+
+    def __init__(self):
+        self.size = 0
+        # the flat indices of the neighbours of every cell
+        self.neighbors = []
+        # the cell orders that the flood fill alternates between: column by column from the left wall, and back
+        self.sweeps = []
+        # scratch lists of the empty cells, and of the player 1 bits of every cell
+        self.empty = []
+        self.words = []
+
+    def _resize(self, size):
+        self.size = size
+        self.neighbors = [[row * size + col for row, col in cells]
+                          for cells in ConnectionTracker._neighbor_table(size)]
+        forward = [row * size + col for col in range(size) for row in range(size)]
+        self.sweeps = [forward, forward[::-1]]
+        self.words = [0] * (size * size)
+
+    # returns a mask with a bit set for every rollout that player 1 won, and the player 1 bits of every cell
+    def play(self, board, samples):
+        if board.size != self.size:
+            self._resize(board.size)
+        size = self.size
+        words = self.words
+        empty = self.empty
+        empty.clear()
+        full = (1 << samples) - 1
+        index = 0
+        for row in board.board:
+            for value in row:
+                if value == 0:
+                    words[index] = 0
+                    empty.append(index)
+                else:
+                    words[index] = full if value == 1 else 0
+                index += 1
+
+        getrandbits = random.getrandbits
+        offset = 0
+        while offset < samples:
+            width = min(PAIRING_BITS, samples - offset)
+            mask = (1 << width) - 1
+            random.shuffle(empty)
+            for first, second in zip(empty[0::2], empty[1::2]):
+                bits = getrandbits(width)
+                words[first] |= bits << offset
+                words[second] |= (bits ^ mask) << offset
+            # the cell left over goes to the player to move
+            if len(empty) % 2 and board.turn == 1:
+                words[empty[-1]] |= mask << offset
+            offset += width
+
+        # grow player 1's groups from the left wall until they stop changing. each sweep can carry a group
+        # across the whole board, so only a winding path needs more than a couple of sweeps
+        reached = [0] * (size * size)
+        for row in range(size):
+            reached[row * size] = words[row * size]
+        neighbors = self.neighbors
+        changed = True
+        while changed:
+            changed = False
+            for sweep in self.sweeps:
+                for cell in sweep:
+                    own = words[cell]
+                    if not own:
+                        continue
+                    old = reached[cell]
+                    grown = old
+                    for neighbor in neighbors[cell]:
+                        grown |= reached[neighbor]
+                    grown &= own
+                    if grown != old:
+                        reached[cell] = grown
+                        changed = True
+        wins = 0
+        for row in range(size):
+            wins |= reached[row * size + size - 1]
+        return wins, words
+
+
+# a copy of the cells, turn and winner of a board, which is all a rollout needs to read. it is much smaller to send
+# to another process than the board itself
+class Position:
+    __slots__ = ('size', 'turn', 'winner', 'board')
+
+    def __init__(self, board):
+        self.size = board.size
+        self.turn = board.turn
+        self.winner = board.winner
+        self.board = [list(row) for row in board.board]
+
+
+# runs simulations from a root position. each one walks down the tree by UCB, adds the children of the node it
+# stops at, finishes the game with random moves, and counts the result in every node it went through
+# with rave, the result also counts towards every sibling whose cell the same player ended up with, and selection
+# blends those statistics in while a node has few visits of its own
+# with a prior heuristic, new children are given the chance that they are the best move, and selection uses PUCT.
+# with a rollout depth, rollouts stop after that many moves and the evaluator scores the position instead
+class TreeSearch:
+    __slots__ = ('max_nodes', 'pool', 'exploration', 'prune', 'samples', 'rave', 'rave_equivalence', 'prior',
+                 'rollout_depth', 'evaluator', 'simulations', 'rollouts', 'batch', 'history', 'size', 'frontier')
+
+    def __init__(self, max_nodes=10**6, exploration=1.0, prune=False, samples=1, rave=False, rave_equivalence=1000,
+                 prior=None, rollout_depth=0, evaluator=None):
+        # the pool is only allocated when the tree is first searched, since a tree that only plays rollouts, or
+        # only stands in for trees in other processes, never needs it
+        self.max_nodes = max_nodes
+        self.pool = None
+        # the weight of the UCB exploration term
+        self.exploration = exploration
+        # leave inferior cells out of the tree, and fill them in before every rollout
+        self.prune = prune
+        # the number of rollouts played from each new leaf. more than one are played as a batch, and every rollout
+        # counts as a visit
+        self.samples = samples
+        # rapid action value estimation. rave_equivalence is the number of visits at which a node's own win rate
+        # and its all-moves-as-first win rate count the same
+        self.rave = rave
+        self.rave_equivalence = rave_equivalence
+        # a Heuristic whose get_child_values give the priors of new children. the exploration weight is then the
+        # PUCT constant
+        self.prior = prior
+        # the number of random moves a rollout plays before the evaluator, a Heuristic, scores it. 0 plays to the end
+        self.rollout_depth = rollout_depth
+        self.evaluator = evaluator
+        # the number of simulations run since the tree was last reset
+        self.simulations = 0
+        self.rollouts = RandomRollout()
+        self.batch = BatchRollout()
+        # the moves and board size of the root position. the tree is only built once there is a board to search
+        self.history = None
+        self.size = 0
+        # a heap of (visits, node) of the nodes that could have their children taken away when the pool runs low.
+        # entries are only checked when they come off the heap, so some are out of date
+        self.frontier = []
+
+    # starts a new tree with only the root
+    def reset(self):
+        if self.pool is None:
+            self.pool = NodePool(self.max_nodes)
+        self.pool.clear()
+        root = self.pool.allocate(1)
+        self.pool.move[root] = NO_MOVE
+        self.pool.parent[root] = -1
+        self.simulations = 0
+        self.frontier = []
+
+    # moves the root to the board's position. if the board is the root position with some more moves played, and
+    # those moves are in the tree, the subtree under them is kept and everything else is dropped. any other board
+    # starts a new tree. returns the number of nodes that were kept
+    def advance(self, board):
+        pool = self.pool
+        history = self.history
+        moves = board.move_list
+        node = -1
+        if pool is not None and history is not None and board.size == self.size and moves[:len(history)] == history:
+            node = 0
+            for move in moves[len(history):]:
+                code = encode(move, board.size)
+                first = pool.first_child[node]
+                for child in range(first, first + pool.child_count[node]):
+                    if pool.move[child] == code:
+                        node = child
+                        break
+                else:
+                    node = -1
+                    break
+        self.history = list(moves)
+        self.size = board.size
+        if node < 0:
+            self.reset()
+            return 0
+        if node > 0:
+            pool.compact(node)
+            self.frontier = [(pool.visits[node], node) for node in range(1, pool.used) if pool.child_count[node]]
+            heapify(self.frontier)
+        return pool.used
+
+    # makes room in a full pool by taking away the children of the least visited nodes whose children are all
+    # leaves, until at most target nodes are used or the deadline passes. returns False if nothing was taken away
+    # the nodes stay where they are, and their blocks go back to the pool's free lists
+    def collapse(self, target, deadline=None):
+        pool = self.pool
+        visits = pool.visits
+        child_count = pool.child_count
+        first_child = pool.first_child
+        frontier = self.frontier
+        freed = 0
+        checked = 0
+        while pool.used > target and frontier:
+            checked += 1
+            if deadline is not None and checked % 64 == 0 and default_timer() >= deadline:
+                break
+            old_visits, node = heappop(frontier)
+            count = child_count[node]
+            if not count:
+                continue
+            # a node with grandchildren goes back on the heap when the last of them are taken away
+            first = first_child[node]
+            if any(child_count[child] for child in range(first, first + count)):
+                continue
+            if visits[node] > old_visits:
+                heappush(frontier, (visits[node], node))
+                continue
+            pool.release(node)
+            freed += count
+            parent = pool.parent[node]
+            if parent > 0:
+                heappush(frontier, (visits[parent], parent))
+        return freed > 0
+
+    # runs simulations from the board for max_time seconds, and returns the number that were run
+    # the tree from the last search is reused if the board carries on from it. when the pool runs low, the least
+    # visited leaves are collapsed until it is three quarters full
+    def search(self, board, max_time):
+        return self.search_until(board, default_timer() + max_time)
+
+    # like search, but stops at a time given by default_timer
+    def search_until(self, board, deadline):
+        self.advance(board)
+        count = 0
+        can_collapse = True
+        while default_timer() < deadline:
+            if can_collapse and self.running_low(board):
+                can_collapse = self.collapse(self.max_nodes * 3 // 4, deadline)
+            self.simulate(board)
+            count += 1
+        return count
+
+    # whether the pool might not have room for the next expansion
+    def running_low(self, board):
+        return self.pool.used + board.size * board.size + 1 > self.max_nodes
+
+    # the moves of the root's children, with their visits and win rates, most visited first
+    def root_moves(self, board):
+        pool = self.pool
+        first = pool.first_child[0]
+        children = []
+        for child in range(first, first + pool.child_count[0]):
+            visits = pool.visits[child]
+            children.append((decode(pool.move[child], board.size), visits, pool.wins[child] / visits if visits else 0))
+        children.sort(key=lambda child: -child[1])
+        return children
+
+    # the most visited move of the root, or None if the root has no children
+    def best_move(self, board):
+        children = self.root_moves(board)
+        return children[0][0] if children else None
+
+    # one simulation from the board. the board is left as it was found
+    def simulate(self, board):
+        path = self.descend(board)
+        result = self.playout(board, self.samples)
+        for _ in range(len(path) - 1):
+            board.undo()
+        self.backup(path, board, self.samples, *result)
+
+    # walks down the tree from the root, expanding the leaf it stops at if it has been reached before, and returns
+    # the path of nodes. the moves are played on the board, which is left at the leaf
+    # a virtual loss counts as that many lost visits through every node on the path, until backup takes it off.
+    # it steers other simulations that are running at the same time down other paths
+    def descend(self, board, virtual_loss=0):
+        pool = self.pool
+        size = board.size
+        node = 0
+        path = [0]
+        # walk down the expanded part of the tree
+        while pool.child_count[node] and board.winner == 0:
+            node = self.select(node)
+            board.play(*decode(pool.move[node], size))
+            path.append(node)
+        # a leaf that has been reached before gets its children, and the simulation continues into one of them
+        if board.winner == 0 and (pool.visits[node] or node == 0) and self.expand(board, node):
+            node = self.select(node)
+            board.play(*decode(pool.move[node], size))
+            path.append(node)
+        if virtual_loss:
+            for node in path:
+                pool.visits[node] += virtual_loss
+        return path
+
+    # counts the result of the rollouts from the end of a path in every node on it. the board is at the root
+    def backup(self, path, board, samples, p1_wins, win_mask=None, words=None, virtual_loss=0):
+        pool = self.pool
+        if words is not None:
+            self.update_amaf(path, board.turn, board.size, samples, win_mask, words)
+        # each node's wins count for the player who made its move, which is the player who chose it
+        mover = board.turn if len(path) % 2 == 0 else -board.turn
+        for node in reversed(path):
+            pool.visits[node] += samples - virtual_loss
+            pool.wins[node] += p1_wins if mover == 1 else samples - p1_wins
+            mover = -mover
+        self.simulations += 1
+
+    # takes a virtual loss back off a path whose rollouts were abandoned
+    def cancel(self, path, virtual_loss):
+        for node in path:
+            self.pool.visits[node] -= virtual_loss
+
+    # counts the rollouts towards the all-moves-as-first statistics of the children of every node on the path.
+    # a child counts the rollouts in which the player to move at its parent owns its cell at the end
+    def update_amaf(self, path, turn, size, samples, win_mask, words):
+        pool = self.pool
+        amaf_visits = pool.amaf_visits
+        amaf_wins = pool.amaf_wins
+        full = (1 << samples) - 1
+        swap_code = size * size
+        for node in path:
+            count = pool.child_count[node]
+            if count:
+                wins = win_mask if turn == 1 else win_mask ^ full
+                first = pool.first_child[node]
+                for child in range(first, first + count):
+                    code = pool.move[child]
+                    if code == swap_code:
+                        continue
+                    owned = words[code] if turn == 1 else words[code] ^ full
+                    if owned:
+                        amaf_visits[child] += owned.bit_count()
+                        amaf_wins[child] += (owned & wins).bit_count()
+            turn = -turn
+
+    # the child with the highest upper confidence bound. unvisited children are tried first
+    def select(self, node):
+        if self.prior is not None:
+            return self.select_puct(node)
+        if self.rave:
+            return self.select_rave(node)
+        pool = self.pool
+        visits = pool.visits
+        wins = pool.wins
+        first = pool.first_child[node]
+        log_visits = math.log(visits[node] + 1)
+        exploration = self.exploration
+        best = first
+        best_score = -1.0
+        for child in range(first, first + pool.child_count[node]):
+            child_visits = visits[child]
+            if child_visits == 0:
+                return child
+            score = wins[child] / child_visits + exploration * math.sqrt(log_visits / child_visits)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    # like select, but each child's win rate is blended with its all-moves-as-first win rate, which takes over
+    # while the child has few visits. beta = sqrt(k / (3n + k)) falls from 1 to 1/2 at k = rave_equivalence visits.
+    # unvisited children aren't forced first, since their all-moves-as-first statistics already say how they do
+    def select_rave(self, node):
+        pool = self.pool
+        visits = pool.visits
+        wins = pool.wins
+        amaf_visits = pool.amaf_visits
+        amaf_wins = pool.amaf_wins
+        first = pool.first_child[node]
+        log_visits = math.log(visits[node] + 1)
+        exploration = self.exploration
+        equivalence = self.rave_equivalence
+        best = first
+        best_score = -1.0
+        for child in range(first, first + pool.child_count[node]):
+            child_visits = visits[child]
+            child_amaf = amaf_visits[child]
+            value = wins[child] / child_visits if child_visits else 0.5
+            if child_amaf:
+                beta = math.sqrt(equivalence / (3 * child_visits + equivalence))
+                value = (1 - beta) * value + beta * amaf_wins[child] / child_amaf
+            score = value + exploration * math.sqrt(log_visits / (child_visits + 1))
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    # PUCT: the exploration term is the child's prior, shrinking as the child is visited. unvisited children
+    # count as even, and with rave the win rates are blended the same way as in select_rave
+    def select_puct(self, node):
+        pool = self.pool
+        visits = pool.visits
+        wins = pool.wins
+        amaf_visits = pool.amaf_visits
+        amaf_wins = pool.amaf_wins
+        prior = pool.prior
+        first = pool.first_child[node]
+        exploration = self.exploration * math.sqrt(visits[node] + 1)
+        rave = self.rave
+        equivalence = self.rave_equivalence
+        best = first
+        best_score = -1.0
+        for child in range(first, first + pool.child_count[node]):
+            child_visits = visits[child]
+            value = wins[child] / child_visits if child_visits else 0.5
+            if rave and amaf_visits[child]:
+                beta = math.sqrt(equivalence / (3 * child_visits + equivalence))
+                value = (1 - beta) * value + beta * amaf_wins[child] / amaf_visits[child]
+            score = value + exploration * prior[child] / (child_visits + 1)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    # the prior of each move: the prior heuristic's values of the children, from the point of view of the player
+    # to move, standardised and put through a softmax. a move that wins on the spot gets the highest value there is
+    def priors(self, board, moves):
+        values = self.prior.get_child_values(board)
+        scores = [0.0 if move == SWAP_MOVE else values[move[0]][move[1]] * board.turn for move in moves]
+        finite = [score for score in scores if not math.isinf(score)]
+        mean = sum(finite) / len(finite) if finite else 0.0
+        spread = math.sqrt(sum((score - mean) ** 2 for score in finite) / len(finite)) if finite else 0.0
+        spread = spread or 1.0
+        weights = [math.exp(max(-PRIOR_LIMIT, min(PRIOR_LIMIT, (score - mean) / spread))) for score in scores]
+        total = sum(weights)
+        return [weight / total for weight in weights]
+
+    # adds a child for every move of the board, in a random order so that the unvisited children are tried
+    # in a random order. returns False if the pool is full
+    def expand(self, board, node):
+        size = board.size
+        moves = [(y, x) for y in range(size) for x in range(size) if board[y][x] == 0]
+        if board.swap_rule and len(board.move_list) == 1:
+            moves.append(SWAP_MOVE)
+        if self.prune:
+            moves = filter_moves(board, moves)
+        pool = self.pool
+        first = pool.allocate(len(moves))
+        if first < 0:
+            return False
+        random.shuffle(moves)
+        for child, move in enumerate(moves, first):
+            pool.move[child] = encode(move, size)
+            pool.parent[child] = node
+        # the priors are worked out once, here, and kept in the pool
+        if self.prior is not None:
+            for child, prior in enumerate(self.priors(board, moves), first):
+                pool.prior[child] = prior
+        pool.first_child[node] = first
+        pool.child_count[node] = len(moves)
+        if node:
+            heappush(self.frontier, (pool.visits[node], node))
+        return True
+
+    # the winner of a random game from the board. filling in the inferior cells needs a copy of the board,
+    # since filled stones can't be undone
+    def rollout(self, board):
+        if self.prune:
+            board = deepcopy(board)
+            fill_inferior(board)
+            if board.winner != 0:
+                return board.winner
+        return self.rollouts.play(board)
+
+    # the number of random games from the board that player 1 wins, out of samples
+    def evaluate(self, board, samples):
+        return self.playout(board, samples)[0]
+
+    # plays rollout_depth random moves, or until somebody wins, and returns player 1's chance of winning from there:
+    # 1 or 0 if the game is over, and otherwise the evaluator's value put through a logistic curve
+    def truncated_rollout(self, board):
+        size = board.size
+        moves = [(y, x) for y in range(size) for x in range(size) if board[y][x] == 0]
+        random.shuffle(moves)
+        played = 0
+        while played < min(self.rollout_depth, len(moves)) and board.winner == 0:
+            board.play(*moves[played])
+            played += 1
+        if board.winner != 0:
+            chance = 1.0 if board.winner == 1 else 0.0
+        else:
+            value = self.evaluator.get_value(board)
+            chance = 1 / (1 + math.exp(-max(-100.0, min(100.0, value))))
+        for _ in range(played):
+            board.undo()
+        return chance
+
+    # the smallest copy of a leaf that its rollouts can be played from, to send to another process. filling in
+    # inferior cells and truncated rollouts need the whole board, the others only read the cells
+    def leaf_copy(self, board):
+        if self.prune or self.rollout_depth:
+            return deepcopy(board)
+        return Position(board)
+
+    # returns (player 1 wins, win mask, words). the win mask and the player 1 bits of every cell are only there if
+    # the games were played as a batch, which they always are with rave, so the final cells can be read
+    # truncated rollouts score fractions of a win, and leave the all-moves-as-first statistics alone
+    def playout(self, board, samples):
+        if board.winner != 0:
+            return (samples if board.winner == 1 else 0), None, None
+        if self.rollout_depth:
+            if self.prune:
+                board = deepcopy(board)
+                fill_inferior(board)
+            return sum(self.truncated_rollout(board) for _ in range(samples)), None, None
+        if samples == 1 and not self.rave:
+            return (1 if self.rollout(board) == 1 else 0), None, None
+        if self.prune:
+            board = deepcopy(board)
+            fill_inferior(board)
+            if board.winner != 0:
+                return (samples if board.winner == 1 else 0), None, None
+        win_mask, words = self.batch.play(board, samples)
+        return win_mask.bit_count(), win_mask, words
@@ -0,0 +1,105 @@
+"""
+Move ordering for the alpha-beta search. Moves that caused cutoffs before are tried first,
+and the full sort of the remaining moves is only done if none of them cause a cutoff
+"""
+from collections import deque
+
+from board import SWAP_MOVE
+
+
+# remembers which moves caused cutoffs, and hands out the moves of a position in the order they should be searched
+class MoveOrdering:
+    def __init__(self, killer_moves=6):
+        # the number of cutoff moves to remember at each depth
+        self.killer_moves = killer_moves
+        self.size = 0
+        self.new_search()
+
+    # the moves of a board size are stored as flat indices, with one extra index for the swap move
+    def _index(self, move):
+        if move == SWAP_MOVE:
+            return self.size * self.size
+        return move[0] * self.size + move[1]
+
+    # the tables are built for one board size, and rebuilt if a board of another size is searched
+    def _resize(self, size):
+        self.size = size
+        cells = size * size + 1
+        # indexed by player number, like the zobrist table. history counts cutoffs weighted by depth,
+        # butterfly counts every search of the move weighted the same way, so history / butterfly is how often
+        # the move causes a cutoff when it's tried
+        self.history = [None, [0] * cells, [0] * cells]
+        self.butterfly = [None, [1] * cells, [1] * cells]
+        # the move that last refuted each opponent move
+        self.countermoves = [None, [None] * cells, [None] * cells]
+        self.killers = []
+
+    # called at the start of every move. the killers start again, and the history of old searches counts for less
+    def new_search(self):
+        if not self.size:
+            return
+        self.killers = []
+        for player in (1, -1):
+            self.history[player] = [count // 2 for count in self.history[player]]
+            self.butterfly[player] = [count // 2 + 1 for count in self.butterfly[player]]
+
+    # the killer moves of a depth, starting from the centre cell
+    def killers_at(self, board, depth):
+        if board.size != self.size:
+            self._resize(board.size)
+        while len(self.killers) <= depth:
+            self.killers.append(deque([(board.size // 2, board.size // 2)] * self.killer_moves,
+                                      maxlen=self.killer_moves))
+        return self.killers[depth]
+
+    # records that a move was searched at a node of the given depth
+    def searched(self, move, depth, player):
+        self.butterfly[player][self._index(move)] += depth * depth
+
+    # records that a move caused a cutoff
+    def cutoff(self, board, move, depth, player):
+        killers = self.killers_at(board, depth)
+        if move not in killers:
+            killers.append(move)
+        self.history[player][self._index(move)] += depth * depth
+        if board.move_list:
+            self.countermoves[player][self._index(board.move_list[-1])] = move
+
+    # yields the moves of a board in stages: the table move, the killers, the countermove, and then the rest.
+    # the rest are sorted by the sorter if there is one, otherwise by their history. nothing is sorted if an
+    # earlier stage causes a cutoff. if allowed is given, only those cells are yielded
+    def moves(self, board, depth, table_move=None, can_swap=False, sorter=None, allowed=None):
+        killers = self.killers_at(board, depth)
+        player = board.turn
+        tried = set()
+
+        cheap = [table_move] if table_move is not None else []
+        cheap.extend(killers)
+        if board.move_list:
+            countermove = self.countermoves[player][self._index(board.move_list[-1])]
+            if countermove is not None:
+                cheap.append(countermove)
+        for move in cheap:
+            # killer moves and countermoves come from other positions, so they might not be legal here
+            if move in tried or (not can_swap if move == SWAP_MOVE else board[move[0]][move[1]] != 0):
+                continue
+            if allowed is not None and move not in allowed:
+                continue
+            tried.add(move)
+            yield move
+
+        size = board.size
+        if allowed is not None:
+            rest = [move for move in allowed if move not in tried]
+        else:
+            rest = [(y, x) for y in range(size) for x in range(size) if board[y][x] == 0 and (y, x) not in tried]
+        if can_swap and SWAP_MOVE not in tried:
+            rest.append(SWAP_MOVE)
+        if sorter is not None:
+            child_val = sorter.get_child_values(board)
+            rest.sort(key=lambda m: 0 if m == SWAP_MOVE else child_val[m[0]][m[1]]*-player)
+        else:
+            history = self.history[player]
+            butterfly = self.butterfly[player]
+            rest.sort(key=lambda m: -history[self._index(m)] / butterfly[self._index(m)])
+        yield from rest
@@ -0,0 +1,351 @@
+"""
+Splits the root of an alpha-beta search over a pool of worker processes
+Also runs Monte Carlo tree searches in parallel, either as separate trees or as one tree with the rollouts spread out
+"""
+import multiprocessing
+import os
+import random
+import sys
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from math import inf
+from timeit import default_timer
+
+from mcts import TreeSearch
+from transposition import SharedTranspositionTable
+
+
+# each worker process keeps its own copy of the player, so its transposition table stays warm between searches
+_worker_player = None
+# the best exact root value found so far by any worker, from the point of view of the player at the root
+_shared_bound = None
+
+
+def _init_worker(player, shared_bound):
+    global _worker_player, _shared_bound
+    _worker_player = player
+    _shared_bound = shared_bound
+
+
+# searches one root move in a worker, starting from the best value any worker has found so far. the search reads
+# the bound again before each of the move's replies, so a better value found meanwhile narrows its window too
+# returns (move, value, move list, exact, time up, nodes searched)
+def _search_root_move(board, move, depth, time_left, age):
+    player = _worker_player
+    player.transposition_table.age = age
+    player.nodes = 0
+    root_player = board.turn
+    bound = _shared_bound.value
+    if root_player == 1:
+        alpha, beta = bound, inf
+    else:
+        alpha, beta = -inf, -bound
+
+    board.play(*move)
+    player.shared_bound = (_shared_bound, root_player, depth - 1)
+    val, move_list, time_up = player.alpha_beta(board, depth - 1, alpha, beta, -root_player,
+                                                player.transposition_table, sorter=player.sorter,
+                                                start_time=default_timer(), max_time=time_left)
+    player.shared_bound = None
+    # anything above the window's lower edge is exact, so it can tighten the other workers' windows. the bound
+    # only ever goes up, so a value above the latest one was above every window the search used
+    bound = _shared_bound.value
+    exact = bound == -inf or val * root_player > bound
+    if exact and not time_up:
+        with _shared_bound.get_lock():
+            if val * root_player > _shared_bound.value:
+                _shared_bound.value = val * root_player
+    return move, val, move_list, exact, time_up, player.nodes
+
+
+# splits the root moves of an alpha-beta search between the player's worker processes
+# the first move is searched on its own to get a bound, then the rest are searched at the same time
+class RootSplitter:
+    def __init__(self, player, workers):
+        self.workers = workers
+        # the positions the workers searched in the last search
+        self.nodes = 0
+        self.shared_bound = multiprocessing.Value('d', -inf)
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(player, self.shared_bound))
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    # returns (value, best_move, time_up) like AlphaBetaPlayer.alpha_beta
+    def search(self, board, depth, moves, age, start_time=None, max_time=None):
+        root_player = board.turn
+        self.shared_bound.value = -inf
+        self.nodes = 0
+
+        def time_left():
+            if not max_time:
+                return None
+            return max_time - (default_timer() - start_time)
+
+        pending = {self.executor.submit(_search_root_move, board, moves[0], depth, time_left(), age): 0}
+        results = [None] * len(moves)
+        submitted = 1
+        time_up = False
+        while pending:
+            timeout = time_left()
+            done, _ = wait(pending, timeout=None if timeout is None else max(timeout, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                time_up = True
+                break
+            for future in done:
+                index = pending.pop(future)
+                results[index] = future.result()
+                time_up = time_up or results[index][4]
+                self.nodes += results[index][5]
+            if time_up:
+                break
+            # the younger brothers wait for the eldest to finish
+            while submitted < len(moves) and len(pending) < self.workers:
+                future = self.executor.submit(_search_root_move, board, moves[submitted], depth, time_left(), age)
+                pending[future] = submitted
+                submitted += 1
+        if time_up:
+            for future in pending:
+                future.cancel()
+            return -inf * root_player, None, True
+
+        # the first exact result with the best value wins, the same as a serial search in the same order
+        value = -inf * root_player
+        best_move = None
+        for move, val, move_list, exact, _, _ in results:
+            if exact and (best_move is None or val * root_player > value * root_player):
+                value = val
+                best_move = (move, move_list)
+        return value, best_move, False
+
+
+def _init_helper(player):
+    global _worker_player
+    _worker_player = player
+    # every helper reports each depth it finishes, which would bury the main process's output
+    sys.stdout = open(os.devnull, 'w')
+
+
+# runs a whole iterative deepening search in a helper. returns (depth reached, value, best_move, nodes searched)
+def _helper_search(board, start_depth, max_time, age):
+    player = _worker_player
+    player.transposition_table.age = age
+    player.nodes = 0
+    val, move_list = player.iterative_deepening(board, max_time, start_depth)
+    return player.depth_reached, val, move_list, player.nodes
+
+
+# runs the same iterative deepening search in several helper processes that share one transposition table
+# half the helpers start a depth ahead, so between them they fill the table with results the others can reuse
+class LazySMP:
+    def __init__(self, player, workers, table_memory):
+        self.workers = workers
+        # the positions the helpers searched in the last search
+        self.nodes = 0
+        self.table = SharedTranspositionTable(table_memory, canonical=player.canonical)
+        helper = copy(player)
+        helper.transposition_table = self.table
+        helper.workers = 1
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_helper, initargs=(helper,))
+
+    def shutdown(self):
+        self.executor.shutdown()
+        self.table.close()
+
+    # returns (value, best_move) from the helper that completed the deepest search
+    def search(self, board, max_time):
+        self.table.new_search()
+        futures = [self.executor.submit(_helper_search, board, 1 + helper % 2, max_time, self.table.age)
+                   for helper in range(self.workers)]
+        # the helpers stop themselves when their time is up, the extra second covers starting the processes
+        done, pending = wait(futures, timeout=max_time + 1)
+        # if none of them made it, the move waits for the first one rather than going without
+        if not done:
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+        for future in pending:
+            future.cancel()
+
+        depth, val, move_list = 0, 0, None
+        self.nodes = sum(future.result()[3] for future in done)
+        for future in futures:
+            if future in done and future.result()[0] > depth:
+                depth, val, move_list, _ = future.result()
+        print('depth reached:', depth)
+        return val, move_list
+
+
+# each Monte Carlo worker keeps its own TreeSearch: a whole tree for the root parallel search, or just the rollout
+# engines for the tree parallel search
+_worker_tree = None
+
+
+def _init_tree_worker(settings):
+    global _worker_tree
+    # forked workers would otherwise all play the same random rollouts
+    random.seed()
+    _worker_tree = TreeSearch(*settings)
+
+
+# runs a worker's own tree search until the deadline. returns (simulations, root moves)
+def _root_tree_search(board, deadline):
+    count = _worker_tree.search_until(board, deadline)
+    return count, _worker_tree.root_moves(board)
+
+
+def _leaf_playout(leaf, samples):
+    return _worker_tree.playout(leaf, samples)
+
+
+# the arguments that rebuild a TreeSearch with the same settings and the given number of nodes
+def _tree_settings(tree, max_nodes):
+    return (max_nodes, tree.exploration, tree.prune, tree.samples, tree.rave, tree.rave_equivalence, tree.prior,
+            tree.rollout_depth, tree.evaluator)
+
+
+# runs a separate tree search in every worker process, and adds up the visits of their root moves
+# each worker has its own pool of nodes the size of the player's, and reuses its tree between moves like the player
+class RootParallelMCTS:
+    def __init__(self, tree, workers):
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_tree_worker,
+                                            initargs=(_tree_settings(tree, tree.max_nodes),))
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    # returns (simulations, root moves), with the root moves as (move, visits, win rate), most visited first
+    def search(self, board, max_time):
+        # the workers stop at the same moment, however long they took to start
+        deadline = default_timer() + max_time
+        futures = [self.executor.submit(_root_tree_search, board, deadline) for _ in range(self.workers)]
+        done, pending = wait(futures, timeout=max_time + 1)
+        # a worker that is still busy with a big tree is left out, rather than holding up the move
+        for future in pending:
+            future.cancel()
+        if pending:
+            print(len(pending), 'of', self.workers, 'workers missed the deadline and were left out')
+
+        count = 0
+        totals = dict()
+        for future in done:
+            simulations, root_moves = future.result()
+            count += simulations
+            for move, visits, win_rate in root_moves:
+                total = totals.setdefault(move, [0, 0])
+                total[0] += visits
+                total[1] += visits * win_rate
+        root_moves = [(move, visits, wins / visits if visits else 0) for move, (visits, wins) in totals.items()]
+        root_moves.sort(key=lambda root_move: -root_move[1])
+        return count, root_moves
+
+
+# descends one tree in this process for several simulations at once, with a virtual loss on each of their paths,
+# and plays their rollouts in the worker processes. only the leaf positions and the results are sent between them
+class TreeParallelMCTS:
+    def __init__(self, tree, workers):
+        self.tree = tree
+        self.workers = workers
+        # two rollouts per worker, so the next one is already waiting when a result comes back
+        self.in_flight = 2 * workers
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_tree_worker,
+                                            initargs=(_tree_settings(tree, 1),))
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+    # runs simulations on the tree until max_time is up, and returns the number that finished
+    # rollouts that are still running at the end are abandoned rather than waited for
+    def search(self, board, max_time):
+        tree = self.tree
+        deadline = default_timer() + max_time
+        tree.advance(board)
+        samples = tree.samples
+        pending = dict()
+        count = 0
+        can_collapse = True
+        while True:
+            now = default_timer()
+            if now >= deadline:
+                break
+            # collapsing frees nodes that the paths of rollouts still out could go through, so it waits for them
+            low = can_collapse and tree.running_low(board)
+            if low and not pending:
+                can_collapse = tree.collapse(tree.max_nodes * 3 // 4, deadline)
+                continue
+            while not low and len(pending) < self.in_flight:
+                path = tree.descend(board, samples)
+                winner = board.winner
+                leaf = None if winner else tree.leaf_copy(board)
+                for _ in range(len(path) - 1):
+                    board.undo()
+                if leaf is None:
+                    tree.backup(path, board, samples, samples if winner == 1 else 0, virtual_loss=samples)
+                    count += 1
+                else:
+                    pending[self.executor.submit(_leaf_playout, leaf, samples)] = path
+                low = can_collapse and tree.running_low(board)
+            if not pending:
+                continue
+            done, _ = wait(pending, timeout=deadline - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                tree.backup(pending.pop(future), board, samples, *future.result(), virtual_loss=samples)
+                count += 1
+
+        for future, path in pending.items():
+            future.cancel()
+            tree.cancel(path, samples)
+        return count
+
+
+# times a fixed search with more and more workers, to see how the parallel search scales
+def benchmark(size=9, depth=3, max_workers=None):
+    from board import HexBoard
+    from heuristic import ShortestPathHeuristic, ChargeHeuristic
+    from player import AlphaBetaPlayer
+
+    board = HexBoard(size)
+    for move in ((size // 2, size // 2), (size // 2 - 1, size // 2 + 1)):
+        board.play(*move)
+    max_workers = max_workers or os.cpu_count()
+    baseline = None
+    workers = 1
+    while workers <= max_workers:
+        player = AlphaBetaPlayer(board.turn, ShortestPathHeuristic(incremental=True), depth,
+                                 sorter=ChargeHeuristic(size), workers=workers)
+        start = default_timer()
+        val, move_list, _ = player.search_root(board, depth)
+        elapsed = default_timer() - start
+        baseline = baseline or elapsed
+        print('workers', workers, 'time %.2f' % elapsed, 'speedup %.2f' % (baseline / elapsed),
+              'move', move_list[0], 'value', val)
+        player.close()
+        workers *= 2
+
+
+# runs Monte Carlo searches of a fixed time with more and more workers, to see how the simulations per second scale
+def benchmark_mcts(size=11, max_time=2, max_workers=None, num_samples=100):
+    from board import HexBoard
+    from player import MonteCarloPlayer
+
+    board = HexBoard(size)
+    max_workers = max_workers or os.cpu_count()
+    for root_parallel in (False, True):
+        workers = 1
+        while workers <= max_workers:
+            player = MonteCarloPlayer(board.turn, size, max_time, num_samples, workers=workers,
+                                      root_parallel=root_parallel)
+            # the first search also starts the worker processes, so only the second is timed
+            player.search(board)
+            start = default_timer()
+            count, root_moves = player.search(board)
+            elapsed = default_timer() - start
+            print('root parallel' if root_parallel else 'tree parallel', 'workers', workers,
+                  'simulations per second %.0f' % (count / elapsed), 'time %.3f' % elapsed, 'move', root_moves[0][0])
+            player.close()
+            workers *= 2
+
+
+if __name__ == '__main__':
+    benchmark()
+    benchmark_mcts()
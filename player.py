@@ -6,14 +6,19 @@ Maybe these should be separated into their own files?
 import random
 import itertools
 from abc import ABC, abstractmethod
-from copy import deepcopy
 
 import math
 from math import inf
 from timeit import default_timer
 
-from board import SWAP_MOVE, HexBoard
-from heuristic import ChargeHeuristic
+from board import SWAP_MOVE
+from heuristic import ChargeHeuristic, ShortestPathHeuristic
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from inferior import candidate_moves, filter_moves
+from mcts import TreeSearch, NODE_BYTES
+from ordering import MoveOrdering
+from parallel import RootSplitter, LazySMP, RootParallelMCTS, TreeParallelMCTS
+from solver import DFPNSolver
 
 
 # a player interface
@@ -80,8 +85,15 @@ class GuiPlayer(HumanPlayer):
 
 # a player that chooses moves randomly
 class RandomPlayer(ComputerPlayer):
+    def __init__(self, player_num, prune=False):
+        super(RandomPlayer, self).__init__(player_num)
+        # skip cells that can't be better than another cell
+        self.prune = prune
+
     def move(self, board):
         options = [(y, x) for (y, x) in itertools.product(range(board.size), repeat=2) if board[y][x] == 0]
+        if self.prune:
+            options = filter_moves(board, options)
         if board.swap_rule and len(board.move_list) == 1:
             options.append(board.move_list[0])
         move = random.choice(options)
@@ -90,7 +102,9 @@ class RandomPlayer(ComputerPlayer):
 
 # uses bounded min-max tree search with alpha beta pruning
 class AlphaBetaPlayer(ComputerPlayer):
-    def __init__(self, player_num, heuristic, search_depth=-1, max_time=0, sorter=None, killer_moves=6):
+    def __init__(self, player_num, heuristic, search_depth=-1, max_time=0, sorter=None, killer_moves=6,
+                 table_memory=2**25, workers=1, lazy_smp=False, pvs=False, aspiration=0, vc_engine=None, vc_depth=2,
+                 prune=False, solver=None, solver_cells=16, book=None, canonical=False):
         super(AlphaBetaPlayer, self).__init__(player_num)
         # the number of moves deep to search in the tree
         self.search_depth = search_depth
@@ -102,20 +116,71 @@ class AlphaBetaPlayer(ComputerPlayer):
         self.sorter = sorter
         # the number of cutoff moves to remember at each depth
         self.killer_moves = killer_moves
+        # killer moves, countermoves and the history of which moves caused cutoffs
+        self.ordering = MoveOrdering(killer_moves)
+        # results of previous searches. kept for the whole game, and limited to roughly table_memory bytes
+        # with canonical keys, positions that are mirror images of each other share their results
+        self.table_memory = table_memory
+        self.canonical = canonical
+        self.transposition_table = TranspositionTable(table_memory, canonical)
+        # the number of processes that split the root moves. the pool is only started when it's first needed
+        self.workers = workers
+        self._splitter = None
+        # with a time limit, the workers can instead each run a whole search and share a transposition table
+        self.lazy_smp = lazy_smp
+        self._smp = None
+        # the last depth iterative deepening completed
+        self.depth_reached = 0
+        # principal variation search: only the first move at a node gets the full window, the rest are searched
+        # with a null window that just checks whether they're better, and are searched again if they are
+        self.pvs = pvs
+        # the half-width of the window each iterative deepening search starts with, around the last value.
+        # 0 searches with the full window
+        self.aspiration = aspiration
+        # finds virtual connections, to end the search early when the game is decided, and to only search the moves
+        # that break the opponent's connections. only used at nodes with at least vc_depth moves left to search
+        self.vc_engine = vc_engine
+        self.vc_depth = vc_depth
+        # leave dead, captured and dominated cells out of the search, at nodes with at least 2 moves left to search
+        self.prune = prune
+        # a proof-number solver that decides the game exactly once there are at most solver_cells empty cells
+        self.solver = solver
+        self.solver_cells = solver_cells
+        # an OpeningBook. positions in the book are played without searching
+        self.book = book
+        # the number of positions searched since the last move, to compare search settings
+        self.nodes = 0
+        # in a worker that searches one root move: (the shared bound, the player at the root, the depth of the
+        # move's position). the bound is the best value any worker has found for the root player
+        self.shared_bound = None
 
         if search_depth < 0 and max_time <= 0:
             raise ValueError('AlphaBetaPlayer needs either a search_depth, or a max_time')
 
     def move(self, board):
-        transposition_table = dict()
-        if self.search_depth < 0:
+        book_move = self.book.lookup(board) if self.book is not None else None
+        if book_move is not None:
+            print('book move:', book_move)
+            board.play(*book_move)
+            return
+
+        self.transposition_table.new_search()
+        self.ordering.new_search()
+        self.nodes = 0
+        if self.search_depth < 0 and self.lazy_smp and self.workers > 1:
+            val, move_list = self.lazy_smp_search(board, self.max_time)
+        elif self.search_depth < 0:
             val, move_list = self.iterative_deepening(board, self.max_time)
         else:
-            val, move_list, time_up = self.alpha_beta(board, self.search_depth, -inf, inf, self.player_num, transposition_table, sorter=self.sorter)
+            val, move_list, time_up = self.search_root(board, self.search_depth)
             # val, move_list = self.MTD_f(board, self.heuristic.get_value(board)+self.player_num, self.search_depth
 
         print('expected value:', val)
         print('expected moves:', move_list)
+        print('nodes searched:', self.nodes)
+        # with lazy smp the helpers probe the shared table, and their counts stay in their own processes
+        if not (self.search_depth < 0 and self.lazy_smp and self.workers > 1):
+            print('table hit rate: %.3f' % self.transposition_table.hit_rate())
 
         # if the game seems lost, resign
         if move_list is None or val*self.player_num <= -10000:
@@ -123,58 +188,186 @@ class AlphaBetaPlayer(ComputerPlayer):
         else:
             board.play(*(move_list[0]))
 
+    # the worker pools can't be sent to other processes, so copies of the player leave them behind
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_splitter'] = None
+        state['_smp'] = None
+        return state
+
+    # stops the worker processes, if there are any
+    def close(self):
+        if self._splitter is not None:
+            self._splitter.shutdown()
+            self._splitter = None
+        if self._smp is not None:
+            self._smp.shutdown()
+            self._smp = None
+
+    # runs an iterative deepening search in every worker process at once, sharing one transposition table,
+    # and keeps the deepest completed result
+    def lazy_smp_search(self, board, max_time):
+        if self._smp is None:
+            self._smp = LazySMP(self, self.workers, self.table_memory)
+        val, move_list = self._smp.search(board, max_time)
+        self.nodes += self._smp.nodes
+        # a helper that didn't finish a single depth has no move. the time is already used up, so a depth 1 search
+        # in this process picks the move rather than resigning
+        if move_list is None:
+            val, move_list, _ = self.alpha_beta(board, 1, -inf, inf, board.turn, self.transposition_table,
+                                                sorter=self.sorter)
+        return val, move_list
+
+    # searches the board to the given depth, splitting the root moves between worker processes if there are any
+    # alpha and beta only narrow the window of a search in this process
+    def search_root(self, board, depth, start_time=None, max_time=None, alpha=-inf, beta=inf):
+        if self.workers <= 1:
+            return self.alpha_beta(board, depth, alpha, beta, board.turn, self.transposition_table,
+                                   sorter=self.sorter, start_time=start_time, max_time=max_time)
+        if self._splitter is None:
+            self._splitter = RootSplitter(self, self.workers)
+        val, move_list, time_up = self._splitter.search(board, depth, self.root_moves(board),
+                                                        self.transposition_table.age, start_time, max_time)
+        self.nodes += self._splitter.nodes
+        # remember the result, so the next deeper search tries the same move first
+        if not time_up and move_list is not None:
+            self.transposition_table.store(board, depth, EXACT, val, move_list)
+        return val, move_list, time_up
+
+    # the legal moves from the board, in the order the search would try them
+    def root_moves(self, board):
+        moves = [(y, x) for (y, x) in itertools.product(range(board.size), repeat=2) if board[y][x] == 0]
+        if board.swap_rule and len(board.move_list) == 1:
+            moves.append(SWAP_MOVE)
+        if self.sorter is not None:
+            child_val = self.sorter.get_child_values(board)
+            moves.sort(key=lambda m: 0 if m == SWAP_MOVE else child_val[m[0]][m[1]]*-board.turn)
+        entry = self.transposition_table.probe(board)
+        if entry is not None and entry[3] is not None and entry[3][0] in moves:
+            moves.remove(entry[3][0])
+            moves.insert(0, entry[3][0])
+        return moves
+
     def alpha_beta(self, board, depth, alpha, beta, player, transposition_table,
-                   killer_moves=None, sorter=None, start_time=None, max_time=None):
-        if killer_moves is None:
-            killer_moves = [[(board.size//2,board.size//2)]*self.killer_moves for _ in range(depth+1)]
-        elif len(killer_moves) < depth:
-            killer_moves.extend(([(board.size//2,board.size//2)]*self.killer_moves for _ in range(depth+1-len(killer_moves))))
+                   ordering=None, sorter=None, start_time=None, max_time=None):
+        if ordering is None:
+            ordering = self.ordering
 
+        self.nodes += 1
         if depth == 0 or board.winner != 0:
             # if we've reached the end, there is no move to make
             return self.heuristic.get_value(board), None, False
 
-        # make a generator for all options
-        options = [(y, x) for (y, x) in itertools.product(range(board.size), repeat=2) if board[y][x] == 0]
-        if board.swap_rule and len(board.move_list) == 1:
-            # options = itertools.chain((board.move_list[0],),options)
-            options.append(SWAP_MOVE)
-
-        # by default, the algorithm searches top-left to bottom-right. if we use a fast heuristic to sort the options,
-        # it can try to find moves that will result in cut-offs early
-        if sorter is not None:
-            child_val = sorter.get_child_values(board)
-            options.sort(key=lambda m: 0 if m == SWAP_MOVE else child_val[m[0]][m[1]]*-board.turn)
-
-        options = itertools.chain(killer_moves[depth], options)
-        searched = set()
+        # a stored result can end the search early, or at least tell us which move to try first
+        table_move = None
+        if transposition_table is not None:
+            entry = transposition_table.probe(board)
+            if entry is not None and entry[3] is not None:
+                entry_depth, flag, entry_val, entry_moves = entry
+                table_move = entry_moves[0]
+                # results from shallower searches can't be trusted at this depth
+                if entry_depth >= depth:
+                    if flag == EXACT:
+                        return entry_val, entry_moves, False
+                    elif flag == LOWER:
+                        alpha = max(alpha, entry_val)
+                    else:
+                        beta = min(beta, entry_val)
+                    if alpha >= beta:
+                        return entry_val, entry_moves, False
+        # the window actually searched decides what kind of bound the result is
+        alpha_searched, beta_searched = alpha, beta
+
+        can_swap = board.swap_rule and len(board.move_list) == 1
+
+        # near the end of the game, the solver can tell who wins without guessing
+        if self.solver is not None and depth > 1:
+            # a swap moves a stone, so it doesn't add one to the board
+            stones = len(board.move_list) - (SWAP_MOVE in board.move_list[1:2])
+            if board.size * board.size - stones <= self.solver_cells:
+                winner, win_move = self.solver.solve(board)
+                if winner == player:
+                    return winner * inf, (win_move, None), False
+                elif winner:
+                    return winner * inf, None, False
+
+        # a connection that can't be stopped decides the game. otherwise, if the opponent has connections that only
+        # need one more move, every move that doesn't break all of them loses
+        allowed = None
+        if self.vc_engine is not None and depth >= self.vc_depth and not can_swap:
+            winner, win_move, allowed = self.vc_engine.analyse(board)
+            if winner == player:
+                return winner * inf, (win_move, None), False
+            elif winner:
+                return winner * inf, None, False
+        # dead, captured and dominated cells never need to be searched
+        if self.prune and depth > 1 and not can_swap:
+            candidates = candidate_moves(board)
+            if allowed is not None:
+                candidates = [move for move in candidates if move in allowed]
+            allowed = candidates or allowed
+
+        # the best move from a previous search goes first, then the killer moves and the countermove.
+        # the rest are only generated and sorted if none of those cause a cutoff
+        options = ordering.moves(board, depth, table_move, can_swap, sorter, allowed)
+
+        # an incremental heuristic values the leaves below this node from the work it does on this node
+        evaluate = None
+        if depth == 1 and self.heuristic.incremental:
+            evaluate = self.heuristic.child_evaluator(board)
+
+        # in a worker searching one root move, other workers can raise the bound on the root's value while this
+        # move is searched. it's only applied at the move's own position, where it narrows the side of the window
+        # the opponent cuts off on, which stays sound however late it is raised
+        shared = None
+        if self.shared_bound is not None and depth == self.shared_bound[2]:
+            shared, root_player, _ = self.shared_bound
 
         # player 1 tries to maximize the board value, player 2 tries to minimize it
         value = -inf if player == 1 else inf
         best_move = None
         time_up = False
+        searched = 0
         for move in options:
-            if board[move[0]][move[1]] != 0 or move in searched:
-                continue
-            searched.add(move)
-            board.play(*move)
-            board_state = board.hashable()
-            if transposition_table is not None:
-                if board_state in transposition_table:
-                    move_val, move_list = transposition_table[board_state]
+            if shared is not None:
+                bound = shared.value
+                if root_player == 1 and bound > alpha:
+                    alpha = alpha_searched = bound
+                elif root_player == -1 and -bound < beta:
+                    beta = beta_searched = -bound
+                # another root move is already at least as good, so this one can't be the best
+                if alpha >= beta:
+                    return (alpha if root_player == 1 else beta), None, False
+            searched += 1
+            if evaluate is not None and move != SWAP_MOVE:
+                self.nodes += 1
+                move_val, move_list = evaluate(*move), None
+            elif self.pvs and searched > 1 and depth > 1:
+                # a null window just above alpha (or below beta) only proves whether the move is any better
+                if player > 0:
+                    null_alpha, null_beta = alpha, math.nextafter(alpha, inf)
                 else:
-                    move_val, move_list, time_up =\
-                        self.alpha_beta(board, depth-1, alpha, beta, -player, transposition_table,
-                                        killer_moves=killer_moves, sorter=sorter, start_time=start_time, max_time=max_time)
-                    if not time_up:
-                        transposition_table[board_state] = (move_val, move_list)
+                    null_alpha, null_beta = math.nextafter(beta, -inf), beta
+                board.play(*move)
+                move_val, move_list, time_up = self.alpha_beta(board, depth-1, null_alpha, null_beta, -player,
+                                                               transposition_table, ordering, sorter,
+                                                               start_time, max_time)
+                # it was better, but the null window only gave a bound, so search it properly
+                if not time_up and alpha < move_val < beta:
+                    move_val, move_list, time_up = self.alpha_beta(board, depth-1, alpha, beta, -player,
+                                                                   transposition_table, ordering, sorter,
+                                                                   start_time, max_time)
+                board.undo()
             else:
-                move_val, move_list, time_up = self.alpha_beta(board, depth-1, alpha, beta, -player, transposition_table,
-                                                               killer_moves, sorter, start_time, max_time)
-            board.undo()
+                board.play(*move)
+                move_val, move_list, time_up = self.alpha_beta(board, depth-1, alpha, beta, -player,
+                                                               transposition_table, ordering, sorter,
+                                                               start_time, max_time)
+                board.undo()
 
             # if we didnt run out of time, we successfully explored this branch
             if not time_up:
+                ordering.searched(move, depth, player)
                 if player > 0:
                     if move_val > value:
                         value = move_val
@@ -188,36 +381,48 @@ class AlphaBetaPlayer(ComputerPlayer):
                 # if we've found a better move, we can do a cutoff
                 if alpha >= beta:
                     # record the move that caused the cutoff
-                    if move not in killer_moves[depth]:
-                        killer_moves[depth].append(move)
-                        killer_moves[depth].pop(0)
+                    ordering.cutoff(board, move, depth, player)
                     break
             # if we've run out of time, we need to get out of this tree search
             if max_time and (time_up or (default_timer() - start_time > max_time)):
                 time_up = True
                 break
+
+        # partial searches are never stored
+        if transposition_table is not None and not time_up and best_move is not None:
+            if value <= alpha_searched:
+                flag = UPPER
+            elif value >= beta_searched:
+                flag = LOWER
+            else:
+                flag = EXACT
+            transposition_table.store(board, depth, flag, value, best_move)
         return value, best_move, time_up
 
     # performs alphabeta searches at increasing depths to allow a time limit on each move
-    def iterative_deepening(self, board, max_time):
+    # the transposition table is kept between depths, so each search starts with the best moves of the last one
+    def iterative_deepening(self, board, max_time, start_depth=1):
         start_time = default_timer()
-        sorter = self.sorter
-        depth = 1
+        depth = start_depth
         val = 0
         move_list = None
         time_up = False
         while not time_up:
-            transposition_table = dict()
-            next_val, next_move_list, time_up = self.alpha_beta(board, depth, -inf, inf, self.player_num, transposition_table,
-                                             sorter=sorter, start_time=start_time, max_time=max_time)
-            print('depth',depth,'value',next_val,'moves',next_move_list, 'time up',time_up)
+            # start with a narrow window around the last value, and widen it if the value falls outside
+            if self.aspiration > 0 and move_list is not None:
+                alpha, beta = val - self.aspiration, val + self.aspiration
+                next_val, next_move_list, time_up = self.search_root(board, depth, start_time, max_time, alpha, beta)
+                if not time_up and not alpha < next_val < beta:
+                    next_val, next_move_list, time_up = self.search_root(board, depth, start_time, max_time)
+            else:
+                next_val, next_move_list, time_up = self.search_root(board, depth, start_time, max_time)
+            print('depth',depth,'value',next_val,'moves',next_move_list, 'time up',time_up, 'nodes',self.nodes)
 
             # if the search at this depth actually completed, record the result
             # keeping results of partial searches may lead to strange moves
             if not time_up:
                 val = next_val
                 move_list = next_move_list
-                # print(transposition_table.values())
                 depth += 1
             # if we've already used the majority of our time, we wont have time to complete another iteration
             if (default_timer() - start_time) / (max_time) > 0.2:
@@ -225,6 +430,7 @@ class AlphaBetaPlayer(ComputerPlayer):
             # if we've found a definite result, no reason to keep searching
             if abs(val) == math.inf:
                 time_up = True
+        self.depth_reached = depth - 1
         print('depth reached:',(depth-1))
         return val, move_list
 
@@ -238,8 +444,8 @@ class AlphaBetaPlayer(ComputerPlayer):
         move_list = None
         while lower < upper:
             bound = max(val, lower + 1)
-            transposition_table = dict()
-            val, move_list, time_up = self.alpha_beta(board, depth, bound - 1, bound, self.player_num, transposition_table)
+            val, move_list, time_up = self.alpha_beta(board, depth, bound - 1, bound, self.player_num,
+                                                      self.transposition_table)
             if val < bound:
                 upper = val
             else:
@@ -247,116 +453,111 @@ class AlphaBetaPlayer(ComputerPlayer):
         return val, move_list
 
 # a player that uses Monte Carlo Tree Search as opposed to the minimax search that AlphaBetaPlayer uses
-# Currently this player uses pure MCTS, meaning that rollouts are done randomly. This means that the
-# player does not take advantage of any of the heuristics to evaluate positions, and does not play very well
+# By default each leaf gets a batch of num_samples random rollouts, played out together on bitboards, and with rave
+# their all-moves-as-first statistics guide selection while the nodes have few visits. A prior heuristic gives new
+# nodes their priors for PUCT selection, and with a rollout_depth the rollouts stop early and the evaluator
+# heuristic scores where they ended up
 class MonteCarloPlayer(ComputerPlayer):
-    def __init__(self, player_num, size, max_time=1, num_samples=100):
+    def __init__(self, player_num, size, max_time=1, num_samples=100, prune=False, book=None, max_nodes=10**6,
+                 rave=True, rave_equivalence=1000, max_memory=None, workers=1, root_parallel=False, prior=None,
+                 rollout_depth=0, evaluator=None):
         super(MonteCarloPlayer, self).__init__(player_num)
+        # an OpeningBook. positions in the book are played without searching
+        self.book = book
+        # leave inferior cells out of the tree, and fill them in before every playout
+        self.prune = prune
         # the amount of time given for searching.
         self.max_time = max_time
-        # the number of rollouts to perform on a leaf node
+        # the number of rollouts to perform on a leaf node. they are played together as one batch
         self.num_samples = num_samples
-        # a list of board states, their visit count, and their children
-        self.search_tree = {HexBoard(size).hashable():[1,0,set()]}
         # tunable exploration parameter for UCB
         self.C = 1
+        # blend all-moves-as-first statistics into the tree's win rates, until a node has about rave_equivalence visits
+        self.rave = rave
+        # the search tree, in a pool of at most max_nodes nodes, or max_memory bytes, that is allocated on the first
+        # search. with root_parallel, only the workers' trees are searched, so this one is never allocated.
+        # the part of the tree under the position that was actually reached is kept from move to move
+        if max_memory is not None:
+            max_nodes = max_memory // NODE_BYTES
+        # a heuristic that gives new nodes their priors, for PUCT selection
+        self.prior = prior
+        # rollouts stop after rollout_depth random moves, and the evaluator heuristic scores them. 0 plays them out
+        self.rollout_depth = rollout_depth
+        if rollout_depth and evaluator is None:
+            evaluator = ShortestPathHeuristic()
+        self.tree = TreeSearch(max_nodes, self.C, prune, num_samples, rave, rave_equivalence, prior, rollout_depth,
+                               evaluator)
+        # the number of processes that play rollouts. the workers either share this player's tree and play its
+        # rollouts, or with root_parallel, each grow a tree of their own. the pool is only started when it's needed
+        self.workers = workers
+        self.root_parallel = root_parallel
+        self._parallel = None
+
+    # the worker pool can't be sent to other processes, so copies of the player leave it behind
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_parallel'] = None
+        return state
+
+    # stops the worker processes, if there are any
+    def close(self):
+        if self._parallel is not None:
+            self._parallel.shutdown()
+            self._parallel = None
+
+    # searches the board for max_time seconds. returns (simulations, root moves), with the root moves as
+    # (move, visits, win rate), most visited first
+    def search(self, board):
+        if self.workers <= 1:
+            return self.tree.search(board, self.max_time), self.tree.root_moves(board)
+        if self._parallel is None:
+            if self.root_parallel:
+                self._parallel = RootParallelMCTS(self.tree, self.workers)
+            else:
+                self._parallel = TreeParallelMCTS(self.tree, self.workers)
+        if self.root_parallel:
+            return self._parallel.search(board, self.max_time)
+        return self._parallel.search(board, self.max_time), self.tree.root_moves(board)
 
     def move(self, board):
         if board.winner != 0:
             return
+        book_move = self.book.lookup(board) if self.book is not None else None
+        if book_move is not None:
+            board.play(*book_move)
+            return
 
         # perform searches for the given amount of time
-        start = default_timer()
-        count = 0
-        while default_timer()-start < self.max_time:
-            count += 1
-            self.MCTS(board)
+        count, root_moves = self.search(board)
         print('completed',count,'searches!')
-
-        # from the given board state, pick the child with the most visits
-        state = self.search_tree[board.hashable()]
-        best_move=None
-        best_visits = 0
-        for move in state[2]:
-            board.play(*move)
-            visits = self.search_tree[board.hashable()][0]
-            board.undo()
-            if visits > best_visits:
-                best_move, best_visits = move, visits
-        board.play(*best_move)
-
-    def MCTS(self, board):
-        state = board.hashable()
-        # if we're starting at a move we've never searched before, add it
-        if state not in self.search_tree:
-            # connect it to its parent node
-            if board.move_list:
-                move = board.move_list[-1]
-                board.undo()
-                self.search_tree[board.hashable()][2].add(move)
-                board.play(*move)
-            self.search_tree[state] = [1,0,set()]
-
-        tree_state = self.search_tree[state]
-        # increase the visit count
-        tree_state[0] += 1
-
-        # if this is a winning state, mark it as a win and back-propagate
-        if board.winner != 0:
-            tree_state[1] += board.turn * board.winner
-            return board.winner
-
-        # if this isnt a final state, expand the monte carlo tree to more nodes
-        options = {(y, x) for (y, x) in itertools.product(range(board.size), repeat=2) if board[y][x] == 0}
-        unvisited = list(options.difference(tree_state[2]))
-        # if we've visited every child, move to one based on UCB
-        if not unvisited:
-            next_move = self.UCB(board, tree_state)
-            board.play(*next_move)
-            winner = self.MCTS(board)
-            board.undo()
-        else:
-            # if there are unexplored children, search one
-            next_move = random.choice(unvisited)
-            tree_state[2].add(next_move)
-            board.play(*next_move)
-            self.search_tree[board.hashable()] = [1,0,set()]
-            winner = self.playout(deepcopy(board))
-            board.undo()
-        tree_state[1] += board.turn * winner
-        return winner
-
-    # returns a move based on a weighted distribution
-    def UCB(self, board, state):
-        weights = []
-        children = list(state[2])
-        for next_move in children:
-            board.play(*next_move)
-            child_state = self.search_tree[board.hashable()]
-            board.undo()
-            weight = child_state[1] + self.C * (math.log(state[0])/child_state[0])**0.5
-            weights.append(weight)
-        return random.choices(children,weights)[0]
+        if not self.root_parallel or self.workers <= 1:
+            print('tree size:', self.tree.pool.used, 'root visits:', self.tree.pool.visits[0])
+
+        # from the given board state, pick the child with the most visits. if no search finished in time, fall back
+        # on whatever the local tree has, and then on a random move
+        if not root_moves and board.move_list == self.tree.history:
+            root_moves = self.tree.root_moves(board)
+        if not root_moves:
+            print('no search finished in time, playing a random move')
+            options = [(y, x) for (y, x) in itertools.product(range(board.size), repeat=2) if board[y][x] == 0]
+            if board.swap_rule and len(board.move_list) == 1:
+                options.append(SWAP_MOVE)
+            if self.prune:
+                options = filter_moves(board, options)
+            board.play(*random.choice(options))
+            return
+        board.play(*root_moves[0][0])
 
     # plays random moves from a board state to see who wins
     def playout(self, board):
-        while board.winner == 0:
-            options = [(y, x) for (y, x) in itertools.product(range(board.size), repeat=2) if board[y][x] == 0]
-            next_move = random.choice(options)
-            board.play(*next_move)
-        return board.winner
+        return self.tree.rollout(board)
 
     # performs multiple playouts and averages them
     def board_eval(self, board, samples):
-        wins = 0
-        losses = 0
-        for i in range(samples):
-            rollout_board = deepcopy(board)
-            winner = self.playout(rollout_board)
-            if winner == board.turn:
-                wins += 1
-            else:
-                losses += 1
+        wins = self.tree.evaluate(board, samples)
+        if board.turn == -1:
+            wins = samples - wins
+        losses = samples - wins
         return (wins-losses)/(wins+losses)
 
 
@@ -376,3 +577,23 @@ class ChargeHeuristicPlayer(ComputerPlayer):
                 move = (y,x)
                 move_curvature = curve[y][x]*-board.turn
         board.play(*move)
+
+
+# a player that tries to prove the game with a proof-number search, and plays the winning move if it finds one
+# if the position can't be proven in time, it plays the fallback player's move, or the solver's most promising move
+class SolverPlayer(ComputerPlayer):
+    def __init__(self, player_num, max_time=1, max_nodes=10**7, fallback=None, vc_engine=None):
+        super(SolverPlayer, self).__init__(player_num)
+        self.max_time = max_time
+        self.solver = DFPNSolver(max_nodes=max_nodes, max_time=max_time, vc_engine=vc_engine)
+        self.fallback = fallback
+
+    def move(self, board):
+        winner, move = self.solver.solve(board)
+        print('proven winner:', winner, 'move:', move, 'nodes:', self.solver.nodes)
+        if winner == -board.turn:
+            board.resign()
+        elif winner == 0 and self.fallback is not None:
+            self.fallback.move(board)
+        else:
+            board.play(*move)
@@ -0,0 +1,151 @@
+"""
+An endgame solver using depth-first proof-number search (DFPN)
+It proves which player wins a position with perfect play, instead of estimating it like the heuristics
+"""
+from timeit import default_timer
+
+from board import SWAP_MOVE
+from inferior import filter_moves
+
+# constants:
+# proof and disproof numbers are capped here, and a capped number means the result is proven
+INFINITE = 10 ** 9
+# a rough size of one table entry in bytes, used to turn a memory budget into a number of entries
+ENTRY_BYTES = 120
+
+
+# every node stores two numbers for the player to move: phi, the number of leaves that still need to be proven to
+# show they win, and delta, the number that need to be proven to show they lose. phi = 0 is a proven win,
+# delta = 0 is a proven loss. the search always expands the child that is cheapest to prove, until a node's
+# numbers pass the thresholds its parent gave it
+class DFPNSolver:
+    def __init__(self, memory=2**25, max_nodes=100000, max_time=0, vc_engine=None, prune=True):
+        # (phi, delta) for every position searched, by zobrist key. kept between calls, so later searches reuse proofs
+        self.table = dict()
+        self.max_entries = max(1, memory // ENTRY_BYTES)
+        # the default budget of each call to solve. max_time = 0 means no time limit
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        # a virtual connection engine proves positions early and narrows the moves down to the must-play cells
+        self.vc_engine = vc_engine
+        # leave out dead, captured and dominated cells
+        self.prune = prune
+        # statistics of the last call to solve
+        self.nodes = 0
+        # keys are only unique within one board size, so the table is cleared when the size changes
+        self._size = None
+        self._stop_nodes = 0
+        self._stop_time = None
+
+    # returns (winner, move). winner is the player who wins with perfect play, or 0 if the budget ran out first.
+    # move is a winning move if the player to move wins, the most promising move if it isn't proven,
+    # and None if the player to move loses
+    def solve(self, board, max_nodes=None, max_time=None):
+        max_time = self.max_time if max_time is None else max_time
+        if board.size != self._size:
+            self.table = dict()
+            self._size = board.size
+        self.nodes = 0
+        self._stop_nodes = self.max_nodes if max_nodes is None else max_nodes
+        self._stop_time = default_timer() + max_time if max_time else None
+
+        if board.winner != 0:
+            return board.winner, None
+        self._mid(board, INFINITE, INFINITE)
+        phi, delta = self.table.get(board.key, (1, 1))
+        if delta == 0:
+            return -board.turn, None
+
+        # the child closest to being proven a win for the player to move, which is a winning child if there is one
+        best_move = None
+        best_delta = INFINITE + 1
+        for move in self._moves(board)[1]:
+            child_phi, child_delta = self.table.get(self._child_key(board, move), (1, 1))
+            if child_delta < best_delta:
+                best_move, best_delta = move, child_delta
+        if phi == 0:
+            if best_delta != 0 and self.vc_engine is not None:
+                # the position was proven by a virtual connection, which knows its own winning move
+                best_move = self.vc_engine.analyse(board)[1]
+            return board.turn, best_move
+        return 0, best_move
+
+    # the key of the board after a move. only the swap move has to be played to find it
+    def _child_key(self, board, move):
+        if move == SWAP_MOVE:
+            board.play(*move)
+            key = board.key
+            board.undo()
+            return key
+        return board.child_key(*move)
+
+    # returns (result, moves). result is (phi, delta) if the position is already decided, and moves are the
+    # moves worth searching
+    def _moves(self, board):
+        moves = [(y, x) for y in range(board.size) for x in range(board.size) if board[y][x] == 0]
+        can_swap = board.swap_rule and len(board.move_list) == 1
+        if can_swap:
+            moves.append(SWAP_MOVE)
+            return None, moves
+        if self.vc_engine is not None:
+            winner, _, must_play = self.vc_engine.analyse(board)
+            if winner == board.turn:
+                return (0, INFINITE), moves
+            elif winner:
+                return (INFINITE, 0), moves
+            if must_play is not None:
+                moves = must_play
+        if self.prune:
+            moves = filter_moves(board, moves)
+        return None, moves
+
+    def _store(self, key, phi, delta):
+        # when the table is full, only proven results are kept
+        if len(self.table) >= self.max_entries:
+            self.table = {k: v for k, v in self.table.items() if 0 in v}
+            if len(self.table) >= self.max_entries // 2:
+                self.table = dict()
+        self.table[key] = (phi, delta)
+
+    def _out_of_budget(self):
+        return self.nodes >= self._stop_nodes or (self._stop_time is not None and default_timer() > self._stop_time)
+
+    # multiple iterative deepening: searches the node until its phi reaches th_phi or its delta reaches th_delta
+    def _mid(self, board, th_phi, th_delta):
+        self.nodes += 1
+        key = board.key
+        # the player who just moved won, so the player to move has lost
+        if board.winner != 0:
+            self._store(key, INFINITE, 0)
+            return
+        result, moves = self._moves(board)
+        if result is not None:
+            self._store(key, *result)
+            return
+        keys = [self._child_key(board, move) for move in moves]
+
+        while True:
+            # a child's delta is how hard it is to prove a win through it, and its phi is how hard it is to refute it
+            phi = INFINITE
+            delta = 0
+            best = 0
+            second_phi = INFINITE
+            for index, child_key in enumerate(keys):
+                child_phi, child_delta = self.table.get(child_key, (1, 1))
+                delta = min(INFINITE, delta + child_phi)
+                if child_delta < phi:
+                    second_phi = phi
+                    phi = child_delta
+                    best = index
+                elif child_delta < second_phi:
+                    second_phi = child_delta
+            if phi >= th_phi or delta >= th_delta or self._out_of_budget():
+                self._store(key, phi, delta)
+                return
+
+            best_phi = self.table.get(keys[best], (1, 1))[0]
+            child_th_phi = INFINITE if th_delta >= INFINITE else th_delta - delta + best_phi
+            child_th_delta = min(th_phi, second_phi + 1)
+            board.play(*moves[best])
+            self._mid(board, child_th_phi, child_th_delta)
+            board.undo()
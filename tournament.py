@@ -0,0 +1,313 @@
+"""
+Plays a match between two players without any prompts, to check whether a change to an engine makes it stronger
+The games are spread over a pool of worker processes. Every random opening is played twice, once with each player
+moving first, and every result is appended to a results file as soon as the game ends
+The Elo difference and a sequential probability ratio test are updated after every game, and the match stops as soon
+as the test accepts one of its hypotheses
+
+Players are given as constructor calls without the player number, and `size` stands for the board size:
+    python tournament.py "AlphaBetaPlayer(TwoDistanceHeuristic(incremental=True), 2, sorter=ChargeHeuristic(size))" \
+        "MonteCarloPlayer(size, max_time=0.5)" --size 7 --games 1000 --workers 4
+"""
+import argparse
+import ast
+import math
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from timeit import default_timer
+
+from board import HexBoard
+from book import OpeningBook
+from heuristic import TwoDistanceHeuristic, ShortestPathHeuristic, ChargeHeuristic, ResistanceHeuristic
+from player import RandomPlayer, AlphaBetaPlayer, MonteCarloPlayer, ChargeHeuristicPlayer, SolverPlayer
+from vc import VCEngine
+
+# constants:
+# the only names a player spec can use, so a spec can't run anything but a constructor
+SPEC_NAMES = {cls.__name__: cls for cls in (RandomPlayer, AlphaBetaPlayer, MonteCarloPlayer, ChargeHeuristicPlayer,
+                                            SolverPlayer, TwoDistanceHeuristic, ShortestPathHeuristic,
+                                            ChargeHeuristic, ResistanceHeuristic, VCEngine, OpeningBook)}
+PLAYERS = ('A', 'B')
+# the first line of a results file describes the match, so a stopped match can be carried on with the same command
+HEADER = '# size %d swap %d opening %d seed %d A %s B %s\n'
+
+
+# checks that a player spec is a call to a player class with constant arguments, and returns its syntax tree
+def parse_spec(spec):
+    try:
+        tree = ast.parse(spec, mode='eval').body
+    except SyntaxError:
+        raise ValueError('%r is not a constructor call' % spec)
+    if not isinstance(tree, ast.Call) or not isinstance(tree.func, ast.Name) or \
+            tree.func.id not in SPEC_NAMES or tree.func.id.endswith('Heuristic'):
+        raise ValueError('%r is not a call to a player class' % spec)
+    _check_spec(tree)
+    return tree
+
+
+def _check_spec(node):
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in SPEC_NAMES:
+            raise ValueError('%s can\'t be called in a player spec' % ast.unparse(node.func))
+        for arg in node.args:
+            _check_spec(arg)
+        for keyword in node.keywords:
+            if keyword.arg is None:
+                raise ValueError('** arguments can\'t be used in a player spec')
+            _check_spec(keyword.value)
+    elif isinstance(node, (ast.List, ast.Tuple)):
+        for element in node.elts:
+            _check_spec(element)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        _check_spec(node.operand)
+    elif isinstance(node, ast.Name):
+        if node.id != 'size':
+            raise ValueError('unknown name %s in a player spec' % node.id)
+    elif not isinstance(node, ast.Constant):
+        raise ValueError('%s can\'t be used in a player spec' % ast.unparse(node))
+
+
+def _build(node, size):
+    if isinstance(node, ast.Call):
+        args = [_build(arg, size) for arg in node.args]
+        kwargs = {keyword.arg: _build(keyword.value, size) for keyword in node.keywords}
+        return SPEC_NAMES[node.func.id](*args, **kwargs)
+    if isinstance(node, ast.List):
+        return [_build(element, size) for element in node.elts]
+    if isinstance(node, ast.Tuple):
+        return tuple(_build(element, size) for element in node.elts)
+    if isinstance(node, ast.UnaryOp):
+        return -_build(node.operand, size)
+    if isinstance(node, ast.Name):
+        return size
+    return node.value
+
+
+# makes a new player from a spec, with the player number as the first argument
+def build_player(spec, player_num, size):
+    tree = parse_spec(spec)
+    args = [player_num] + [_build(arg, size) for arg in tree.args]
+    kwargs = {keyword.arg: _build(keyword.value, size) for keyword in tree.keywords}
+    return SPEC_NAMES[tree.func.id](*args, **kwargs)
+
+
+# the random opening of a pair of games. it only depends on the seed and the pair, so a carried on match
+# plays the same openings it would have played without stopping
+def opening(size, moves, seed, pair):
+    rng = random.Random('%d-%d' % (seed, pair))
+    return rng.sample([(row, col) for row in range(size) for col in range(size)], moves)
+
+
+# the players print their searches, which would only get in the way of the match
+def _init_game_worker():
+    sys.stdout = open(os.devnull, 'w')
+
+
+# plays one game in a worker and returns (winner, moves, seconds), where the winner is 'A' or 'B'
+def play_game(specs, size, swap_rule, opening_moves, seed, game):
+    random.seed(seed * 1000003 + game)
+    board = HexBoard(size, swap_rule)
+    for move in opening_moves:
+        board.play(*move)
+    # A moves first in even games, and B in odd games
+    first = game % 2
+    players = {1: build_player(specs[first], 1, size), -1: build_player(specs[1 - first], -1, size)}
+    start = default_timer()
+    while board.winner == 0:
+        count = len(board.move_list)
+        players[board.turn].move(board)
+        if len(board.move_list) == count and board.winner == 0:
+            raise RuntimeError('%s didn\'t move' % specs[first if board.turn == 1 else 1 - first])
+    for player in players.values():
+        if hasattr(player, 'close'):
+            player.close()
+    winner = PLAYERS[first] if board.winner == 1 else PLAYERS[1 - first]
+    return winner, len(board.move_list), default_timer() - start
+
+
+# the score of the match so far, with the Elo difference of A over B and the log likelihood ratio of the
+# sequential probability ratio test of elo0 against elo1
+class MatchStats:
+    def __init__(self, elo0=0, elo1=20, alpha=0.05, beta=0.05):
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.wins = {player: 0 for player in PLAYERS}
+        # how many games the player moving first won, to see how much the openings favour them
+        self.first_wins = 0
+        self.games = 0
+        # the test accepts elo1 above the upper bound and elo0 below the lower bound
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self._win_llr = math.log(expected_score(elo1) / expected_score(elo0))
+        self._loss_llr = math.log((1 - expected_score(elo1)) / (1 - expected_score(elo0)))
+
+    def add(self, game, winner):
+        self.games += 1
+        self.wins[winner] += 1
+        self.first_wins += winner == PLAYERS[game % 2]
+
+    def score(self):
+        return self.wins['A'] / self.games if self.games else 0.5
+
+    # returns the Elo difference and its 95% confidence interval as (elo, low, high)
+    # the interval is the wilson score interval, which stays open on one side when every game went the same way
+    # rather than shrinking to nothing, and an Elo difference that can't be told from the score is infinite
+    def elo(self):
+        if not self.games:
+            return 0.0, -math.inf, math.inf
+        score = self.score()
+        z = 1.96
+        n = self.games
+        center = (score + z * z / (2 * n)) / (1 + z * z / n)
+        margin = z * math.sqrt(score * (1 - score) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        low = elo_difference(center - margin) if score > 0 else -math.inf
+        high = elo_difference(center + margin) if score < 1 else math.inf
+        return elo_difference(score), low, high
+
+    # Hex has no draws, so every game is a Bernoulli trial
+    def llr(self):
+        return self.wins['A'] * self._win_llr + self.wins['B'] * self._loss_llr
+
+    # returns 'H1' when A is elo1 stronger, 'H0' when it's no more than elo0 stronger, or None to keep playing
+    def sprt(self):
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+    def report(self):
+        elo, low, high = self.elo()
+        return 'games %d A %d B %d first %d elo %.1f (%.1f, %.1f) llr %.2f (%.2f, %.2f) [%g, %g]' % (
+            self.games, self.wins['A'], self.wins['B'], self.first_wins, elo, low, high, self.llr(), self.lower,
+            self.upper, self.elo0, self.elo1)
+
+
+# the expected score of a player that is elo stronger than its opponent
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+# reads the games already in a results file made by the same match, and returns {game: winner}
+def read_results(path, header):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        if file.readline() != header:
+            raise ValueError('%s has the results of a different match' % path)
+        results = dict()
+        for line in file:
+            game, _, winner = line.split('\t')[:3]
+            results[int(game)] = winner
+    return results
+
+
+# plays the match, appending a line of game, first player, winner, moves, seconds and opening to the results file
+# for every game, and returns the stats
+def run(specs, size=7, swap_rule=False, games=100, workers=None, opening_moves=1, seed=0, output=None,
+        elo0=0, elo1=20, alpha=0.05, beta=0.05, verbose=True):
+    for spec in specs:
+        parse_spec(spec)
+    stats = MatchStats(elo0, elo1, alpha, beta)
+    header = HEADER % (size, swap_rule, opening_moves, seed, specs[0], specs[1])
+    results = read_results(output, header) if output else None
+    done = set()
+    if results:
+        for game in sorted(results):
+            stats.add(game, results[game])
+        done = set(results)
+        if verbose:
+            print('carrying on from', stats.report())
+    results_file = None
+    if output:
+        results_file = open(output, 'a')
+        if results is None:
+            results_file.write(header)
+            results_file.flush()
+
+    workers = workers or os.cpu_count()
+    queue = (game for game in range(games + games % 2) if game not in done)
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_game_worker)
+    pending = dict()
+    start = default_timer()
+    try:
+        decision = stats.sprt()
+        while decision is None:
+            # only a few games are queued at a time, so the match can stop as soon as the test decides
+            while len(pending) < 2 * workers:
+                game = next(queue, None)
+                if game is None:
+                    break
+                moves = opening(size, opening_moves, seed, game // 2)
+                future = executor.submit(play_game, specs, size, swap_rule, moves, seed, game)
+                pending[future] = (game, moves)
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                game, moves = pending.pop(future)
+                winner, length, seconds = future.result()
+                stats.add(game, winner)
+                if results_file:
+                    results_file.write('%d\t%s\t%s\t%d\t%.2f\t%s\n' % (
+                        game, PLAYERS[game % 2], winner, length, seconds,
+                        ' '.join('%d,%d' % (row + 1, col + 1) for row, col in moves)))
+                    results_file.flush()
+                if verbose:
+                    print(stats.report(), 'time %.0f' % (default_timer() - start))
+            decision = stats.sprt()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        if results_file:
+            results_file.close()
+    if verbose:
+        if decision == 'H1':
+            print('A is stronger: accepted elo >= %g' % elo1)
+        elif decision == 'H0':
+            print('A is not stronger: accepted elo <= %g' % elo0)
+        else:
+            print('no decision after %d games' % stats.games)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='play a match between two players and report the Elo difference')
+    parser.add_argument('player_a', help='the player being tested, as a constructor call without the player number')
+    parser.add_argument('player_b', help='the player it is compared against')
+    parser.add_argument('--size', type=int, default=7, help='the board size')
+    parser.add_argument('--swap', action='store_true', help='use the swap rule')
+    parser.add_argument('--games', type=int, default=1000, help='the most games to play, rounded up to an even number')
+    parser.add_argument('--workers', type=int, help='the number of worker processes, by default one per cpu')
+    parser.add_argument('--opening', type=int, default=1, help='the number of random moves every game starts with')
+    parser.add_argument('--seed', type=int, default=0, help='picks the openings')
+    parser.add_argument('--output', help='the results file, carried on if it has the same match')
+    parser.add_argument('--elo0', type=float, default=0, help='the Elo difference of the null hypothesis')
+    parser.add_argument('--elo1', type=float, default=20, help='the Elo difference of the alternative hypothesis')
+    parser.add_argument('--alpha', type=float, default=0.05, help='the chance of accepting elo1 when elo0 is true')
+    parser.add_argument('--beta', type=float, default=0.05, help='the chance of accepting elo0 when elo1 is true')
+    args = parser.parse_args()
+
+    for spec in (args.player_a, args.player_b):
+        try:
+            parse_spec(spec)
+        except ValueError as error:
+            parser.error(str(error))
+    run((args.player_a, args.player_b), args.size, args.swap, args.games, args.workers, args.opening, args.seed,
+        args.output, args.elo0, args.elo1, args.alpha, args.beta)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+A fixed size transposition table, used by the alpha-beta search to remember results between searches
+"""
+import struct
+from multiprocessing import shared_memory
+
+# constants:
+# the kind of value stored in an entry
+# the value is the real value of the position
+EXACT = 0
+# the search failed high, so the real value is at least the stored value
+LOWER = 1
+# the search failed low, so the real value is at most the stored value
+UPPER = 2
+
+# a rough size of one stored entry in bytes, used to turn a memory budget into a number of slots
+ENTRY_BYTES = 160
+
+
+# the key of a board, and the symmetry that maps it to the stored position. with canonical keys, a position and its
+# mirror images share an entry
+def _lookup_key(board, canonical):
+    if canonical:
+        return board.canonical_key
+    return board.key, 0
+
+
+# moves a result between the board and the stored position. every symmetry is its own inverse, so this works in
+# both directions. the symmetries that swap the colours also negate the value, so a lower bound becomes an upper bound
+def _translate(board, symmetry, flag, value, move_list):
+    if symmetry == 0:
+        return flag, value, move_list
+    if symmetry >= 2:
+        value = -value
+        if flag != EXACT:
+            flag = LOWER if flag == UPPER else UPPER
+    return flag, value, _translate_line(board, symmetry, move_list)
+
+
+def _translate_line(board, symmetry, move_list):
+    if move_list is None:
+        return None
+    return board.map_move(move_list[0], symmetry), _translate_line(board, symmetry, move_list[1])
+
+
+# stores search results in two tiers of slots indexed by the board's zobrist key
+# the first tier keeps the deepest result for a slot, the second tier always takes the newest result
+# with canonical keys, positions that are mirror images of each other share an entry
+class TranspositionTable:
+    def __init__(self, memory=2**25, canonical=False):
+        # the number of slots in each tier
+        self.slots = max(1, memory // ENTRY_BYTES // 2)
+        # each slot holds (key, depth, flag, value, move_list, age) or None
+        self.deep = [None] * self.slots
+        self.recent = [None] * self.slots
+        self.canonical = canonical
+        # entries from older searches are replaced first
+        self.age = 0
+        # statistics, to see how much the table is helping
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    # called at the start of every move, so that old entries can be recognised
+    def new_search(self):
+        self.age = (self.age + 1) % 256
+
+    # removes every entry
+    def clear(self):
+        self.deep = [None] * self.slots
+        self.recent = [None] * self.slots
+
+    # returns (depth, flag, value, move_list) for the board, or None if it hasn't been stored
+    def probe(self, board):
+        key, symmetry = _lookup_key(board, self.canonical)
+        index = key % self.slots
+        self.probes += 1
+        for tier in (self.deep, self.recent):
+            entry = tier[index]
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return (entry[1],) + _translate(board, symmetry, *entry[2:5])
+        return None
+
+    # records a search result. depth is the remaining search depth of the result
+    def store(self, board, depth, flag, value, move_list):
+        key, symmetry = _lookup_key(board, self.canonical)
+        flag, value, move_list = _translate(board, symmetry, flag, value, move_list)
+        index = key % self.slots
+        entry = (key, depth, flag, value, move_list, self.age)
+        self.stores += 1
+        old = self.deep[index]
+        # the deep tier is only replaced by a result at least as deep, or when its entry is from an old search
+        if old is None or old[0] == key or old[5] != self.age or depth >= old[1]:
+            self.deep[index] = entry
+            # the result it pushed out still gets a chance in the other tier
+            if old is not None and old[0] != key:
+                self.recent[index] = old
+        else:
+            self.recent[index] = entry
+
+    # the fraction of probes that found an entry
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0
+
+
+# each shared entry is three unsigned 64 bit words: the key xor the other two words, the value's bits, and the
+# depth, flag, age and move packed together
+_SHARED_ENTRY = struct.Struct('<QQQ')
+_DOUBLE = struct.Struct('<d')
+_WORD = struct.Struct('<Q')
+
+
+# a transposition table that several processes can use at the same time, stored in shared memory
+# there are no locks. an entry that was half written by another process fails the xor check and is treated as missing
+# it has one depth-preferred tier, and only remembers the best move rather than the whole line
+class SharedTranspositionTable:
+    def __init__(self, memory=2**25, name=None, canonical=False):
+        self.slots = max(1, memory // _SHARED_ENTRY.size)
+        # the process that creates the memory is the one that frees it
+        self._owner = name is None
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=self.slots * _SHARED_ENTRY.size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.canonical = canonical
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    # other processes get a handle to the same memory instead of a copy
+    def __getstate__(self):
+        return self.memory.name, self.slots, self.age, self.canonical
+
+    def __setstate__(self, state):
+        name, slots, age, canonical = state
+        self.__init__(slots * _SHARED_ENTRY.size, name, canonical)
+        self.age = age
+
+    # detaches from the memory, and frees it if this process created it
+    def close(self):
+        self.memory.close()
+        if self._owner:
+            self.memory.unlink()
+
+    def new_search(self):
+        self.age = (self.age + 1) % 256
+
+    def clear(self):
+        self.memory.buf[:] = bytes(len(self.memory.buf))
+
+    # reads and checks the entry in a slot. returns (key, depth, flag, value, move, age), or None if it's torn
+    def _read(self, index):
+        check, value_bits, data = _SHARED_ENTRY.unpack_from(self.memory.buf, index * _SHARED_ENTRY.size)
+        key = check ^ value_bits ^ data
+        if data == 0:
+            return None
+        depth = data & 0xffff
+        flag = (data >> 16) & 0x3
+        age = (data >> 18) & 0xff
+        row = (data >> 26) & 0xff
+        col = (data >> 34) & 0xff
+        # moves are stored two higher, so the swap move fits and 0 means no move
+        move = (row - 2, col - 2) if row else None
+        return key, depth, flag, _DOUBLE.unpack(_WORD.pack(value_bits))[0], move, age
+
+    def probe(self, board):
+        key, symmetry = _lookup_key(board, self.canonical)
+        self.probes += 1
+        entry = self._read(key % self.slots)
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        move = entry[4]
+        return (entry[1],) + _translate(board, symmetry, entry[2], entry[3], (move, None) if move is not None else None)
+
+    def store(self, board, depth, flag, value, move_list):
+        key, symmetry = _lookup_key(board, self.canonical)
+        flag, value, move_list = _translate(board, symmetry, flag, value, move_list)
+        index = key % self.slots
+        old = self._read(index)
+        if old is not None and old[0] != key and old[5] == self.age and old[1] > depth:
+            return
+        self.stores += 1
+        row, col = (move_list[0][0] + 2, move_list[0][1] + 2) if move_list is not None else (0, 0)
+        data = depth | flag << 16 | self.age << 18 | row << 26 | col << 34 | 1 << 42
+        value_bits = _WORD.unpack(_DOUBLE.pack(value))[0]
+        _SHARED_ENTRY.pack_into(self.memory.buf, index * _SHARED_ENTRY.size, key ^ value_bits ^ data, value_bits, data)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0
@@ -0,0 +1,224 @@
+"""
+Virtual connections: ways for a player to connect two points that the opponent can't stop
+A full connection (VC) holds even if the opponent moves first. A semi connection (SC) holds if the owner moves first.
+Connections are built from adjacency, bridges and edge templates with the AND and OR rules of H-search,
+and every connection keeps its carrier, the empty cells it needs, as a bitmask over a BitLayout
+"""
+from collections import deque
+from math import inf
+
+from bitboard import get_layout
+
+
+# the edge templates, for the top edge. each is the row of the anchor cell, and the cells it needs, as (row, col)
+# offsets from the anchor's column
+# template II is a bridge to the edge, template IIIa is the ziggurat
+EDGE_TEMPLATES = [
+    (1, [(0, 0), (0, 1)]),
+    (2, [(2, 1), (1, 0), (1, 1), (1, 2), (0, 0), (0, 1), (0, 2), (0, 3)]),
+]
+
+
+# the templates reflected left to right. a reflection of the board that keeps the top edge
+# moves (row, col) to (row, -col - row), and the anchor is moved back to column 0
+def _reflected(templates):
+    return [(anchor, [(row, anchor - row - col) for row, col in carrier]) for anchor, carrier in templates]
+
+
+# the masks of the stones of each player, indexed by player number, and the empty cells, using the board's layout
+def board_masks(board):
+    layout = get_layout(board.size)
+    if hasattr(board, 'masks'):
+        stones = board.masks
+    else:
+        stones = [0, 0, 0]
+        for row in range(board.size):
+            for col in range(board.size):
+                if board[row][col] != 0:
+                    stones[board[row][col]] |= layout.bit(row, col)
+    return stones, layout.full & ~(stones[1] | stones[-1])
+
+
+# finds the virtual connections of one player between their two edges
+class VCEngine:
+    def __init__(self, max_vcs=4, max_scs=12, max_steps=100000):
+        # the number of connections kept between each pair of points. more finds more, but takes longer
+        self.max_vcs = max_vcs
+        self.max_scs = max_scs
+        # the number of times the AND rule can be tried in one search
+        self.max_steps = max_steps
+        self._templates = dict()
+
+    # every edge template that fits on the board, as (anchor, carrier, edge) with the anchor as a bit and
+    # the carrier as a mask. edge is 0 for the player's first edge and 1 for the second
+    def templates(self, size, player):
+        if (size, player) not in self._templates:
+            layout = get_layout(size)
+            found = []
+            for anchor_row, carrier in EDGE_TEMPLATES + _reflected(EDGE_TEMPLATES):
+                for anchor_col in range(size):
+                    cells = [(anchor_row, anchor_col)] + [(row, anchor_col + col) for row, col in carrier]
+                    if not all(0 <= row < size and 0 <= col < size for row, col in cells):
+                        continue
+                    # the top edge is player 2's first edge. the bottom edge is the top edge rotated half a turn,
+                    # and player 1's edges are those two transposed
+                    for edge in (0, 1):
+                        if edge == 1:
+                            placed = [(size - 1 - row, size - 1 - col) for row, col in cells]
+                        else:
+                            placed = cells
+                        if player == 1:
+                            placed = [(col, row) for row, col in placed]
+                        mask = 0
+                        for row, col in placed[1:]:
+                            mask |= layout.bit(row, col)
+                        found.append((layout.bit(*placed[0]), mask, edge))
+            self._templates[(size, player)] = found
+        return self._templates[(size, player)]
+
+    # runs H-search for the player. returns (vcs, scs) between the player's edges,
+    # where vcs is a list of carriers and scs is a list of (carrier, key cell bit)
+    def connections(self, board, player):
+        layout = get_layout(board.size)
+        stones, empty = board_masks(board)
+        stones = stones[player]
+        if player == 1:
+            walls = (layout.left, layout.right)
+        else:
+            walls = (layout.top, layout.bottom)
+
+        # the points that connections join: the two edges with the stones touching them, the other groups,
+        # and the empty cells. cells[p] is the stones or cell of a point, and groups are points with stones
+        cells = []
+        liberties = []
+        for wall in walls:
+            group = layout.flood(stones & wall, stones)
+            cells.append(group)
+            liberties.append((wall | layout.neighbors(group)) & empty)
+        remaining = stones & ~(cells[0] | cells[1])
+        while remaining:
+            group = layout.flood(remaining & -remaining, stones)
+            remaining &= ~group
+            cells.append(group)
+            liberties.append(layout.neighbors(group) & empty)
+        groups = len(cells)
+        # the point of every empty cell, by bit
+        point_of = dict()
+        remaining = empty
+        while remaining:
+            bit = remaining & -remaining
+            remaining ^= bit
+            point_of[bit] = len(cells)
+            cells.append(bit)
+            liberties.append(layout.neighbors(bit) & empty)
+        for point in range(groups):
+            for bit in _bits(cells[point]):
+                point_of[bit] = point
+
+        vcs = dict()
+        scs = dict()
+        partners = [set() for _ in cells]
+        queue = deque()
+
+        def add_vc(a, b, carrier):
+            pair = (a, b) if a < b else (b, a)
+            known = vcs.setdefault(pair, [])
+            if any(old & ~carrier == 0 for old in known) or len(known) >= self.max_vcs:
+                return
+            known[:] = [old for old in known if carrier & ~old != 0]
+            known.append(carrier)
+            partners[a].add(b)
+            partners[b].add(a)
+            queue.append((a, b, carrier))
+
+        def add_sc(a, b, carrier, key):
+            pair = (a, b) if a < b else (b, a)
+            if any(old & ~carrier == 0 for old in vcs.get(pair, ())):
+                return
+            known = scs.setdefault(pair, [])
+            if any(old & ~carrier == 0 for old, _ in known):
+                return
+            # the OR rule: semi connections whose carriers have nothing in common make a full connection
+            union = intersection = carrier
+            for old, _ in known:
+                if intersection & old != intersection:
+                    intersection &= old
+                    union |= old
+                    if not intersection:
+                        add_vc(a, b, union)
+                        break
+            if len(known) < self.max_scs:
+                known[:] = [(old, old_key) for old, old_key in known if carrier & ~old != 0]
+                known.append((carrier, key))
+
+        # adjacent points are connected with nothing in between
+        for point in range(len(cells)):
+            for bit in _bits(liberties[point]):
+                if point < groups or point_of[bit] > point:
+                    add_vc(point, point_of[bit], 0)
+        # stones and empty cells next to an edge can be joined to it by a template
+        for anchor, carrier, edge in self.templates(board.size, player):
+            if carrier & ~empty or not anchor & (stones | empty) or point_of[anchor] < 2:
+                continue
+            add_vc(point_of[anchor], edge, carrier)
+
+        # the AND rule: two full connections through a common point with disjoint carriers are a full connection
+        # if the point is a group, or a semi connection if the point is an empty cell that has to be taken first
+        steps = 0
+        while queue and steps < self.max_steps and not vcs.get((0, 1)):
+            a, b, carrier = queue.popleft()
+            for start, middle in ((a, b), (b, a)):
+                for end in list(partners[middle]):
+                    if end == start:
+                        continue
+                    pair = (middle, end) if middle < end else (end, middle)
+                    for other in list(vcs[pair]):
+                        steps += 1
+                        if carrier & other or cells[start] & other or cells[end] & carrier:
+                            continue
+                        if middle < groups:
+                            add_vc(start, end, carrier | other)
+                        else:
+                            add_sc(start, end, carrier | other | cells[middle], cells[middle])
+        return vcs.get((0, 1), []), scs.get((0, 1), [])
+
+    # looks for a decided game, or a small set of moves the player to move has to choose from
+    # returns (winner, move, must_play). winner is the player with a connection that can't be stopped, or 0,
+    # move is a winning move for the player to move if they have one, and must_play is a list of the only cells
+    # that can stop the opponent's semi connections, or None if the opponent has none
+    def analyse(self, board):
+        player = board.turn
+        layout = get_layout(board.size)
+        vcs, scs = self.connections(board, player)
+        if scs:
+            return player, layout.cell(scs[0][1].bit_length() - 1), None
+        if vcs:
+            # extra stones never hurt in hex, so any move keeps the connection. one from the carrier helps most
+            carrier = min(vcs, key=lambda mask: bin(mask).count('1'))
+            return player, layout.cell((carrier & -carrier).bit_length() - 1), None
+
+        vcs, scs = self.connections(board, -player)
+        if vcs:
+            return -player, None, None
+        if not scs:
+            return 0, None, None
+        # every semi connection has to be broken, so the move has to be in all of their carriers
+        must_play = layout.full
+        for carrier, _ in scs:
+            must_play &= carrier
+        if not must_play:
+            return -player, None, []
+        return 0, None, layout.cells(must_play)
+
+    # the value of a decided game, in the same units as the heuristics, or None if it isn't decided
+    def get_value(self, board):
+        winner, _, _ = self.analyse(board)
+        return winner * inf if winner else None
+
+
+# splits a mask into its single bits
+def _bits(mask):
+    while mask:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit